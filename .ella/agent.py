@@ -1,25 +1,37 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import ast
+import base64
+import concurrent.futures
+import contextlib
 import fnmatch
+import hashlib
+import http.client
 import json
 import os
 import re
 import shlex
 import shutil
+import signal
+import ssl
 import subprocess
 import sys
+import threading
 import time
-import urllib.error
+import urllib.parse
 import urllib.request
+import xml.etree.ElementTree as ElementTree
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator
 
 
 ROOT = Path.cwd()
 RUNNER_TEMP = Path(os.environ.get("RUNNER_TEMP", "/tmp"))
 OUT = RUNNER_TEMP / "ella-output"
 OUT.mkdir(parents=True, exist_ok=True)
+CACHE_DIR = Path(os.environ.get("ELLA_CACHE_DIR", "").strip()
+                 or Path.home() / ".cache" / "ella")
 
 SAFE_LABELS_DEFAULT = [
     {"name": "bug", "color": "d73a4a", "description": "Something is not working"},
@@ -94,6 +106,15 @@ def env_int(name: str, default: int) -> int:
         return default
 
 
+def env_bool(name: str, default: bool) -> bool:
+    raw = os.environ.get(name, "").strip().lower()
+    if raw in {"1", "true", "yes", "on"}:
+        return True
+    if raw in {"0", "false", "no", "off"}:
+        return False
+    return default
+
+
 MAX_ATTEMPTS = env_int("ELLA_MAX_ATTEMPTS", 15)
 TIME_LIMIT_SECONDS = env_int("ELLA_TIME_LIMIT_SECONDS", 3600)
 
@@ -103,6 +124,91 @@ MAX_CONTEXT_REQUESTED_FILE_BYTES = env_int(
     "ELLA_MAX_CONTEXT_REQUESTED_FILE_BYTES", 250_000)
 MAX_CONTEXT_REPO_FILES_BYTES = env_int(
     "ELLA_MAX_CONTEXT_REPO_FILES_BYTES", 200_000)
+CONTEXT_TOKEN_BUDGET = env_int("ELLA_CONTEXT_TOKEN_BUDGET", 120_000)
+FILE_WINDOW_LINES = env_int("ELLA_FILE_WINDOW_LINES", 400)
+FILE_WINDOW_RADIUS = env_int("ELLA_FILE_WINDOW_RADIUS", 20)
+SOLVE_PRESELECT_FILES = env_int("ELLA_SOLVE_PRESELECT_FILES", 6)
+SYMBOL_INDEX_KEEP = 8
+MAX_RETRIEVAL_ROUNDS = env_int("ELLA_MAX_RETRIEVAL_ROUNDS", 3)
+SEARCH_MAX_RESULTS = env_int("ELLA_SEARCH_MAX_RESULTS", 40)
+SEARCH_MAX_RESULT_BYTES = 12_000
+SEARCH_MAX_FILE_BYTES = 1_000_000
+SEARCH_MAX_QUERIES = 5
+
+GITHUB_API_URL = os.environ.get(
+    "GITHUB_API_URL", "").strip() or "https://api.github.com"
+GITHUB_MAX_RETRIES = env_int("ELLA_GITHUB_MAX_RETRIES", 3)
+GITHUB_MAX_BACKOFF_SECONDS = env_int("ELLA_GITHUB_MAX_BACKOFF_SECONDS", 60)
+GITHUB_IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+GITHUB_POOL_SIZE = env_int("ELLA_GITHUB_POOL_SIZE", 4)
+GITHUB_POOL_IDLE_SECONDS = env_int("ELLA_GITHUB_POOL_IDLE_SECONDS", 60)
+
+PROGRESS_MIN_INTERVAL_SECONDS = env_int(
+    "ELLA_PROGRESS_MIN_INTERVAL_SECONDS", 5)
+LABEL_CACHE_TTL_SECONDS = env_int("ELLA_LABEL_CACHE_TTL_SECONDS", 86_400)
+
+AI_POOL_SIZE = env_int("ELLA_AI_POOL_SIZE", 4)
+AI_POOL_IDLE_SECONDS = env_int("ELLA_AI_POOL_IDLE_SECONDS", 60)
+AI_REQUEST_TIMEOUT_SECONDS = 900
+AI_MAX_RESPONSE_BYTES = env_int("ELLA_AI_MAX_RESPONSE_BYTES", 8_000_000)
+AI_CACHE_CONTROL = env_bool("ELLA_AI_CACHE_CONTROL", False)
+CONVERSATION_MODE = env_bool("ELLA_CONVERSATION_MODE", False)
+CONVERSATION_TOKEN_BUDGET = env_int("ELLA_CONVERSATION_TOKEN_BUDGET", 100_000)
+
+INSTALL_CACHE_ENABLED = env_bool("ELLA_INSTALL_CACHE", True)
+GITHUB_HOSTED_RUNNER = os.environ.get("RUNNER_ENVIRONMENT") == "github-hosted"
+INSTALL_CACHE_MAX_MB = env_int("ELLA_INSTALL_CACHE_MAX_MB", 2048 if GITHUB_HOSTED_RUNNER else 10_240)
+
+BUILD_CACHE_ENABLED = env_bool("ELLA_BUILD_CACHE", True)
+BUILD_CACHE_MAX_MB = env_int("ELLA_BUILD_CACHE_MAX_MB", 1024 if GITHUB_HOSTED_RUNNER else 4096)
+BUILD_CACHE_PATTERNS = [
+    ".turbo",
+    ".next/cache",
+    ".eslintcache",
+    ".pytest_cache",
+    ".mypy_cache",
+    ".ruff_cache",
+]
+
+INSTALL_CACHE_LOCKFILES = {
+    "pnpm": ["pnpm-lock.yaml"],
+    "npm": ["package-lock.json"],
+    "yarn": ["yarn.lock"],
+    "bun": ["bun.lockb", "bun.lock"],
+    "uv": ["uv.lock"],
+    "poetry": ["poetry.lock"],
+    "composer": ["composer.lock"],
+}
+
+CHECK_CONCURRENCY = env_int("ELLA_CHECK_CONCURRENCY", 0)
+CHECK_MEMORY_MB = env_int("ELLA_CHECK_MEMORY_MB", 2048)
+CHECKS_FAIL_FAST = env_bool("ELLA_CHECKS_FAIL_FAST", False)
+CHECK_STATS_ENABLED = env_bool("ELLA_CHECK_STATS", True)
+CHECK_CACHE_ENABLED = env_bool("ELLA_CHECK_CACHE", True)
+CHECK_CACHE_MAX_MB = env_int("ELLA_CHECK_CACHE_MAX_MB", 64)
+TEST_SHARDS = env_int("ELLA_TEST_SHARDS", 0)
+TEST_SHARD_MIN_SECONDS = env_int("ELLA_TEST_SHARD_MIN_SECONDS", 30)
+TEST_CHECKS = {"node-test", "python-pytest", "go-test"}
+WARM_CHECKS_ENABLED = env_bool("ELLA_WARM_CHECKS", False)
+WARM_CHECK_SETTLE_SECONDS = 2.0
+FIX_CANDIDATES = max(1, env_int("ELLA_FIX_CANDIDATES", 1))
+CANDIDATE_RANK = [
+    "ok",
+    "checks_failed",
+    "diff_check_failed",
+    "no_changes",
+    "needs_files",
+    "apply_error",
+    "ai_endpoint",
+    "cancelled",
+]
+
+CHECK_DEPENDENCIES = {
+    "node-build": ["node-typecheck"],
+    "cargo-test": ["cargo-clippy"],
+    "dotnet-build": ["dotnet-restore"],
+    "dotnet-test": ["dotnet-build"],
+}
 
 MAX_TOKENS = {
     "ask": env_int("ELLA_MAX_TOKENS_ASK", 2048),
@@ -120,8 +226,12 @@ class CommandError(Exception):
     pass
 
 
-def write_debug(name: str, text: str) -> None:
-    (OUT / name).write_text(text, encoding="utf-8", errors="replace")
+class ConnectError(ConnectionError):
+    pass
+
+
+def write_debug(name: str, text: str, out: Path = OUT) -> None:
+    (out / name).write_text(text, encoding="utf-8", errors="replace")
 
 
 def read_text_limited(path: Path, limit: int) -> str:
@@ -136,6 +246,315 @@ def read_text_limited(path: Path, limit: int) -> str:
         return ""
 
 
+IMPORT_SPEC_RE = re.compile(
+    r"""(?:\bfrom\s+|\bimport\s+|\brequire\(\s*|\bimport\(\s*)['"]([^'"]+)['"]|^\s*(?:from|import)\s+([\w.]+)""",
+    re.MULTILINE,
+)
+
+
+SYMBOL_INDEX_EXTENSIONS = {".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".py", ".go", ".rs"}
+SYMBOL_PATTERNS = [
+    re.compile(
+        r"^\s*export\s+(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+        r"(?:function\*?|class|const|let|var|interface|type|enum)\s+([A-Za-z_$][\w$]*)", re.MULTILINE),
+    re.compile(r"^(?:async\s+)?(?:def|class)\s+([A-Za-z_]\w*)", re.MULTILINE),
+    re.compile(r"^func\s+(?:\([^)]*\)\s*)?([A-Z]\w*)", re.MULTILINE),
+    re.compile(r"^\s*pub\s+(?:async\s+)?(?:fn|struct|enum|trait|type)\s+(\w+)", re.MULTILINE),
+]
+EXPORT_LIST_RE = re.compile(r"^\s*export\s*(?:type\s*)?\{([^}]*)\}", re.MULTILINE)
+ROUTE_CALL_RE = re.compile(
+    r"""\b(?:app|router|server|api)\.(?:get|post|put|patch|delete|all|route)\(\s*['"`](/[^'"`]*)""")
+ISSUE_STOP_WORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "when", "should", "would", "could",
+    "not", "are", "was", "but", "have", "has", "into", "there", "src", "app", "apps", "lib",
+    "packages", "index", "components", "component", "page", "file", "files", "test", "tests",
+    "route", "routes", "layout", "get", "post", "put", "patch", "delete", "default", "props",
+    "type", "types", "util", "utils", "config",
+}
+
+
+def file_route(rel: str) -> str | None:
+    parts = rel.split("/")
+    stem = parts[-1].split(".", 1)[0]
+    for marker, stems in (("app", {"page", "route"}), ("pages", None)):
+        if marker not in parts[:-1] or (stems is not None and stem not in stems):
+            continue
+        start = len(parts) - 1 - parts[::-1].index(marker, 1)
+        segments = parts[start + 1:-1] if stems is not None else [*parts[start + 1:-1], stem]
+        segments = [seg for seg in segments if not seg.startswith("(") and seg != "index"]
+        return "/" + "/".join(segments)
+    return None
+
+
+def scan_source_file(rel: str, text: str) -> dict[str, list[str]]:
+    symbols: list[str] = []
+    for pattern in SYMBOL_PATTERNS:
+        symbols.extend(pattern.findall(text))
+    for group in EXPORT_LIST_RE.findall(text):
+        for item in group.split(","):
+            name = item.strip().split(" as ")[-1].strip()
+            if re.fullmatch(r"[A-Za-z_$][\w$]*", name):
+                symbols.append(name)
+    symbols = list(dict.fromkeys(symbols))
+
+    routes = ROUTE_CALL_RE.findall(text)
+    route = file_route(rel)
+    if route is not None:
+        routes.insert(0, route)
+
+    imports: list[str] = []
+    for match in IMPORT_SPEC_RE.finditer(text):
+        spec = match.group(1) or match.group(2) or ""
+        if spec and spec not in imports:
+            imports.append(spec)
+
+    components = [name for name in symbols if name[:1].isupper()] if rel.endswith((".tsx", ".jsx")) else []
+    return {
+        "symbols": symbols[:80],
+        "components": components[:40],
+        "routes": list(dict.fromkeys(routes))[:20],
+        "imports": imports[:60],
+    }
+
+
+def issue_terms(text: str) -> tuple[set[str], set[str]]:
+    identifiers = set(re.findall(r"[A-Za-z_$][\w$]{2,}", text))
+    words: set[str] = set()
+    for ident in identifiers:
+        words.add(ident.lower())
+        for part in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", ident):
+            if len(part) >= 3:
+                words.add(part.lower())
+    return identifiers, words - ISSUE_STOP_WORDS
+
+
+def score_index_entry(rel: str, entry: dict[str, Any], text: str, identifiers: set[str], words: set[str]) -> int:
+    score = 0
+    for name in entry.get("symbols", []):
+        if name in identifiers and name.lower() not in ISSUE_STOP_WORDS:
+            score += 5
+        elif len(name) >= 4 and name.lower() in words:
+            score += 3
+    for route in entry.get("routes", []):
+        if len(route) > 1 and route in text:
+            score += 4
+    for part in re.split(r"[/._\-\[\]()]+", rel.lower()):
+        if len(part) >= 3 and part in words:
+            score += 1
+    return score
+
+
+WORD_RE = re.compile(r"\w{3,}")
+
+
+REGEX_LOOKAROUNDS = ("(?=", "(?!", "(?<=", "(?<!", "(?#")
+
+
+def strip_regex_lookarounds(query: str) -> str:
+    kept: list[str] = []
+    depth = 0
+    index = 0
+    while index < len(query):
+        token = query[index:index + 2] if query[index] == "\\" else query[index]
+        index += len(token)
+        if token == "(" and (depth or query.startswith(REGEX_LOOKAROUNDS, index - 1)):
+            depth += 1
+        elif token == ")" and depth:
+            depth -= 1
+        elif not depth:
+            kept.append(token)
+    return "".join(kept)
+
+
+class TrigramIndex:
+    def __init__(self, files: dict[str, str]) -> None:
+        self.files = files
+        self.postings: dict[str, set[str]] = {}
+        for rel, text in files.items():
+            grams: set[str] = set()
+            for word in set(WORD_RE.findall(text.lower())):
+                grams.update(word[i:i + 3] for i in range(len(word) - 2))
+            for gram in grams:
+                self.postings.setdefault(gram, set()).add(rel)
+
+    @staticmethod
+    def required_words(query: str, regex: bool) -> list[str]:
+        if not regex:
+            return WORD_RE.findall(query.lower())
+        query = re.sub(r"\[(?:\\.|[^\]])*\]", ".", query)
+        query = strip_regex_lookarounds(query)
+        query = re.sub(r"\(\?P=\w+\)", ".", re.sub(r"\(\?P<\w+>", "(", query))
+        if "|" in query or re.search(r"\)[?*{]", query):
+            return []
+        query = re.sub(r"\{[\d,\s]*\}", "*", query)
+        query = re.sub(r"\\[a-zA-Z0-9]", ".", query)
+        words: list[str] = []
+        for match in re.finditer(r"((?:\\[^a-zA-Z0-9]|[^\\.^$*+?{}\[\]|()])+)([*?]?)", query):
+            run = re.sub(r"\\(.)", r"\1", match.group(1))
+            if match.group(2):
+                run = run[:-1]
+            words.extend(WORD_RE.findall(run.lower()))
+        return words
+
+    def candidates(self, query: str, regex: bool) -> set[str] | None:
+        result: set[str] | None = None
+        for word in self.required_words(query, regex):
+            for i in range(len(word) - 2):
+                found = self.postings.get(word[i:i + 3], set())
+                result = set(found) if result is None else result & found
+                if not result:
+                    return set()
+        return result
+
+
+def parse_search_requests(items: Any) -> list[dict[str, Any]]:
+    searches: list[dict[str, Any]] = []
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, str):
+            item = {"query": item}
+        if not isinstance(item, dict) or not isinstance(item.get("query"), str) or not item["query"].strip():
+            continue
+        prefix = item.get("path").strip() if isinstance(item.get("path"), str) else ""
+        prefix = prefix[2:] if prefix.startswith("./") else prefix
+        searches.append({
+            "query": item["query"],
+            "regex": bool(item.get("regex", False)),
+            "path": prefix if prefix and safe_rel_path(prefix) else "",
+        })
+    return searches[:SEARCH_MAX_QUERIES]
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+DIFF_HUNK_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+LINE_RANGE_RE = re.compile(r"^(.+?):(\d+)(?:-(\d+))?$")
+BLOCK_START_RE = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?"
+    r"(?:def|class|function|fn|func|interface|impl|struct|enum|type|(?:const|let)\s+\w+\s*=\s*(?:async\s*)?(?:\(|function))\b")
+
+
+def diff_hunk_ranges(diff: str) -> dict[str, list[tuple[int, int]]]:
+    ranges: dict[str, list[tuple[int, int]]] = {}
+    current: str | None = None
+    for line in diff.splitlines():
+        if line.startswith("diff --git "):
+            current = line.rsplit(" b/", 1)[-1]
+            ranges.setdefault(current, [])
+            continue
+        match = DIFF_HUNK_RE.match(line)
+        if match and current is not None:
+            start = int(match.group(1))
+            length = int(match.group(2) or 1)
+            ranges[current].append((start, start + max(length, 1) - 1))
+    return ranges
+
+
+def failing_line_numbers(rel: str, text: str) -> list[int]:
+    names = {rel}
+    parts = rel.split("/")
+    if len(parts) > 2:
+        names.add("/".join(parts[-2:]))
+    lines: list[int] = []
+    for name in names:
+        escaped = re.escape(name)
+        for match in re.finditer(rf"{escaped}(?::|\(|\", line )(\d+)", text):
+            lines.append(int(match.group(1)))
+    return sorted(set(lines))
+
+
+def split_line_range(item: str) -> tuple[str, tuple[int, int] | None]:
+    match = LINE_RANGE_RE.match(item)
+    if not match:
+        return item, None
+    start = int(match.group(2))
+    end = int(match.group(3) or start)
+    return match.group(1), (min(start, end), max(start, end))
+
+
+def expand_to_block(lines: list[str], start: int, end: int, limit: int = 80) -> tuple[int, int]:
+    first = start
+    for index in range(start, max(-1, start - limit), -1):
+        if BLOCK_START_RE.match(lines[index]):
+            first = index
+            break
+    indent = len(lines[first]) - len(lines[first].lstrip())
+    last = end
+    for index in range(end + 1, min(len(lines), end + limit)):
+        line = lines[index]
+        if line.strip() and BLOCK_START_RE.match(line) and len(line) - len(line.lstrip()) <= indent:
+            break
+        last = index
+    return first, last
+
+
+def render_line_windows(
+    text: str,
+    focus: list[tuple[int, int]],
+    radius: int,
+    expand: bool = True,
+) -> str:
+    lines = text.splitlines()
+    if not lines:
+        return ""
+    spans: list[tuple[int, int]] = []
+    for start, end in focus or [(1, 1)]:
+        start = min(max(start, 1), len(lines)) - 1
+        end = min(max(end, start + 1), len(lines)) - 1
+        first, last = expand_to_block(lines, start, end) if expand else (start, end)
+        spans.append((max(0, first - radius), min(len(lines) - 1, last + radius)))
+
+    spans.sort()
+    merged = [spans[0]]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    width = len(str(len(lines)))
+    out: list[str] = []
+    shown = 0
+    for start, end in merged:
+        if start > shown:
+            out.append(f"{'.' * width} | [lines {shown + 1}-{start} not shown]")
+        out.extend(f"{index + 1:>{width}} | {lines[index]}" for index in range(start, end + 1))
+        shown = end + 1
+    if shown < len(lines):
+        out.append(f"{'.' * width} | [lines {shown + 1}-{len(lines)} not shown]")
+    return "\n".join(out)
+
+
+def import_stems(text: str) -> set[str]:
+    stems: set[str] = set()
+    for match in IMPORT_SPEC_RE.finditer(text):
+        spec = match.group(1) or match.group(2) or ""
+        if "/" in spec or spec.startswith("."):
+            name = spec.rstrip("/").rsplit("/", 1)[-1]
+            name = "" if name in {".", ".."} else name.split(".", 1)[0]
+        else:
+            name = spec.rsplit(".", 1)[-1]
+        if name:
+            stems.add(name)
+    return stems
+
+
+def module_stem(rel: str) -> str:
+    path = Path(rel)
+    stem = path.name.split(".", 1)[0]
+    if stem in {"index", "__init__", "mod", "main"}:
+        return path.parent.name
+    return stem
+
+
+def mentioned_in(rel: str, text: str) -> bool:
+    if rel in text:
+        return True
+    parts = rel.split("/")
+    return len(parts) > 2 and "/".join(parts[-2:]) in text
+
+
 def run_cmd(
     args: list[str],
     *,
@@ -165,11 +584,6 @@ def run_cmd(
     return result
 
 
-def gh(args: list[str], *, check: bool = True) -> str:
-    result = run_cmd(["gh", *args], check=check, capture=True, timeout=120)
-    return result.stdout
-
-
 def git(args: list[str], *, check: bool = True) -> str:
     result = run_cmd(["git", *args], check=check, capture=True, timeout=900)
     return result.stdout
@@ -215,19 +629,40 @@ def load_ignore_patterns() -> list[str]:
     return patterns
 
 
-def is_ignored(path: str, patterns: list[str]) -> bool:
-    normalized = path.replace("\\", "/")
-    for pattern in patterns:
-        p = pattern.strip().replace("\\", "/")
-        if not p:
-            continue
-        if fnmatch.fnmatch(normalized, p):
+class IgnoreMatcher:
+    def __init__(self, patterns: list[str]) -> None:
+        self.patterns = list(patterns)
+        full: list[str] = []
+        names: list[str] = []
+        prefixes: list[str] = []
+
+        for pattern in self.patterns:
+            p = pattern.strip().replace("\\", "/")
+            if not p:
+                continue
+            full.append(fnmatch.translate(p))
+            if p.endswith("/**"):
+                prefixes.append(p[:-3])
+            if "/" not in p:
+                names.append(fnmatch.translate(p))
+
+        self.full_re = re.compile("|".join(full)) if full else None
+        self.name_re = re.compile("|".join(names)) if names else None
+        self.prefixes = tuple(prefixes)
+
+    def matches(self, path: str) -> bool:
+        normalized = path.replace("\\", "/")
+        if self.prefixes and normalized.startswith(self.prefixes):
             return True
-        if p.endswith("/**") and normalized.startswith(p[:-3]):
+        if self.full_re is not None and self.full_re.match(normalized):
             return True
-        if "/" not in p and fnmatch.fnmatch(Path(normalized).name, p):
+        if self.name_re is not None and self.name_re.match(Path(normalized).name):
             return True
-    return False
+        return False
+
+
+def is_ignored(path: str, matcher: IgnoreMatcher) -> bool:
+    return matcher.matches(path)
 
 
 def load_labels() -> list[dict[str, str]]:
@@ -281,6 +716,1109 @@ def tail_text(path: Path, lines: int = 100) -> str:
     return "\n".join(content[-lines:])
 
 
+def available_memory_mb() -> int | None:
+    try:
+        for line in Path("/proc/meminfo").read_text(encoding="utf-8").splitlines():
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def check_concurrency(count: int) -> int:
+    if CHECK_CONCURRENCY:
+        return max(1, min(CHECK_CONCURRENCY, count))
+    limit = os.cpu_count() or 1
+    memory = available_memory_mb()
+    if memory is not None:
+        limit = min(limit, memory // CHECK_MEMORY_MB)
+    return max(1, min(limit, count))
+
+
+def failure_signature(log_tail: str) -> str:
+    lines = [line.strip() for line in log_tail.splitlines() if line.strip()][-20:]
+    normalized = re.sub(r"\d+(\.\d+)?(ms|s)?", "0", "\n".join(lines))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+GO_PACKAGE_RESULT_RE = re.compile(r"^(?:ok|FAIL)\s+(\S+)\s+([\d.]+)s\b", re.MULTILINE)
+
+
+def is_go_package_pattern(arg: str) -> bool:
+    return arg in {".", "all"} or arg.startswith(("./", "../"))
+
+
+def junit_file_durations(path: Path) -> dict[str, float]:
+    durations: dict[str, float] = {}
+    try:
+        cases = ElementTree.parse(path).getroot().iter("testcase")
+        for case in cases:
+            rel = case.get("file")
+            if rel:
+                durations[rel] = durations.get(rel, 0.0) + float(case.get("time") or 0)
+    except (OSError, ElementTree.ParseError, ValueError):
+        return {}
+    return durations
+
+
+def go_package_durations(text: str) -> dict[str, float]:
+    return {match.group(1): float(match.group(2)) for match in GO_PACKAGE_RESULT_RE.finditer(text)}
+
+
+def balance_shards(items: list[str], durations: dict[str, float], count: int) -> list[list[str]]:
+    known = sorted(durations[item] for item in items if item in durations)
+    default = known[len(known) // 2] if known else 1.0
+    shards: list[tuple[float, int, list[str]]] = [(0.0, i, []) for i in range(count)]
+    for item in sorted(items, key=lambda x: (-durations.get(x, default), x)):
+        load, index, members = min(shards)
+        members.append(item)
+        shards[index] = (load + durations.get(item, default), index, members)
+    return [members for _, _, members in sorted(shards, key=lambda x: x[1]) if members]
+
+
+def run_check_graph(
+    checks: list[tuple[str, list[str]]],
+    run_check: Callable[[str, list[str], threading.Event], tuple[bool, str]],
+    *,
+    max_workers: int,
+    fail_fast: bool,
+    abort: threading.Event | None = None,
+) -> dict[str, tuple[str, str]]:
+    names = {name for name, _ in checks}
+    deps = {
+        name: [dep for dep in CHECK_DEPENDENCIES.get(name, []) if dep in names]
+        for name, _ in checks
+    }
+    results: dict[str, tuple[str, str]] = {}
+    pending = list(checks)
+    running: dict[concurrent.futures.Future[tuple[bool, str]], str] = {}
+    cancel = threading.Event()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            aborted = abort is not None and abort.is_set()
+            if aborted:
+                cancel.set()
+            for item in list(pending):
+                name, cmd = item
+                if aborted:
+                    results[name] = ("cancelled", "")
+                    pending.remove(item)
+                    continue
+                if cancel.is_set():
+                    results[name] = (
+                        "skipped", "Skipped because an earlier check failed and fail-fast is on.")
+                    pending.remove(item)
+                    continue
+                not_passed = [dep for dep in deps[name]
+                              if dep in results and results[dep][0] != "passed"]
+                if not_passed:
+                    results[name] = (
+                        "skipped", f"Skipped because {', '.join(not_passed)} did not pass.")
+                    pending.remove(item)
+                    continue
+                if any(dep not in results for dep in deps[name]) or len(running) >= max_workers:
+                    continue
+                pending.remove(item)
+                running[pool.submit(run_check, name, cmd, cancel)] = name
+
+            if not running:
+                for name, _ in pending:
+                    results[name] = (
+                        "skipped", "Skipped because its dependencies could not be scheduled.")
+                break
+
+            done, _ = concurrent.futures.wait(
+                running, timeout=0.5, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    success, log_tail = future.result()
+                except Exception as exc:
+                    success, log_tail = False, str(exc)
+                if success:
+                    results[name] = ("passed", log_tail)
+                elif cancel.is_set():
+                    results[name] = ("cancelled", log_tail)
+                else:
+                    results[name] = ("failed", log_tail)
+                    if fail_fast:
+                        cancel.set()
+
+    return results
+
+
+def sync_working_tree(src: Path, dst: Path) -> None:
+    changed: set[str] = set()
+    for root in (src, dst):
+        result = run_cmd(["git", "ls-files", "--modified", "--others", "--exclude-standard"],
+                         check=False, capture=True, cwd=root)
+        changed.update(line for line in result.stdout.splitlines() if line)
+
+    for rel in sorted(changed):
+        source, target = src / rel, dst / rel
+        if not source.exists():
+            if target.is_file() or target.is_symlink():
+                target.unlink()
+            continue
+        if target.is_file() and source.read_bytes() == target.read_bytes():
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source, target)
+
+
+def working_tree_hash(root: Path) -> str | None:
+    result = run_cmd(["git", "rev-parse", "--git-dir"], check=False, cwd=root)
+    if result.returncode != 0:
+        return None
+    git_dir = Path(result.stdout.strip())
+    if not git_dir.is_absolute():
+        git_dir = root / git_dir
+    index = RUNNER_TEMP / f"ella-index-{os.getpid()}-{threading.get_ident()}"
+    try:
+        if (git_dir / "index").exists():
+            shutil.copyfile(git_dir / "index", index)
+        env = {**os.environ, "GIT_INDEX_FILE": str(index)}
+        if run_cmd(["git", "add", "-A"], check=False, cwd=root, env=env).returncode != 0:
+            return None
+        tree = run_cmd(["git", "write-tree"], check=False, cwd=root, env=env)
+        return tree.stdout.strip() if tree.returncode == 0 else None
+    finally:
+        index.unlink(missing_ok=True)
+
+
+def copy_tree_fast(src: Path, dst: Path) -> None:
+    if dst.is_file() or dst.is_symlink():
+        dst.unlink()
+    elif dst.exists():
+        shutil.rmtree(dst, ignore_errors=True)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    result = subprocess.run(["cp", "-a", "--reflink=auto", str(src), str(dst)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if result.returncode == 0:
+        return
+    shutil.rmtree(dst, ignore_errors=True)
+    if src.is_dir():
+        shutil.copytree(src, dst, symlinks=True)
+    else:
+        shutil.copy2(src, dst, follow_symlinks=False)
+
+
+def dir_size_bytes(path: Path) -> int:
+    total = 0
+    for base, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(base, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def evict_lru_entries(store: Path, max_bytes: int) -> list[str]:
+    entries: list[tuple[float, int, Path]] = []
+    for meta_path in store.glob("*/meta.json"):
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            entries.append((float(meta.get("last_used", 0)), int(meta.get("size_bytes", 0)), meta_path.parent))
+        except Exception:
+            shutil.rmtree(meta_path.parent, ignore_errors=True)
+
+    evicted: list[str] = []
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        evicted.append(entry.name)
+    return evicted
+
+
+TURBO_SCRIPT_RE = re.compile(r"^(turbo(?: run)? [\w:.-]+(?: [^&|;]*?)?)(?: && (.+))?$")
+TSC_SCRIPT_RE = re.compile(r"^tsc((?: [^&|;<>]*)?)$")
+VITEST_SCRIPT_RE = re.compile(r"^vitest(?: run)?( --passWithNoTests)?$")
+ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]|\x1bc")
+TSC_START_RE = re.compile(r"Starting compilation in watch mode|File change detected\. Starting incremental compilation")
+TSC_RESULT_RE = re.compile(r"Found (\d+) errors?\b")
+
+WARM_VITEST_HELPER = """\
+import readline from 'node:readline'
+import { createVitest } from 'vitest/node'
+
+const vitest = await createVitest('test', {
+  watch: false,
+  passWithNoTests: process.argv.includes('--passWithNoTests'),
+})
+console.log('ELLA_WARM_READY')
+
+for await (const line of readline.createInterface({ input: process.stdin })) {
+  try {
+    for (const file of JSON.parse(line)) vitest.invalidateFile(file)
+    const specs = await vitest.globTestSpecifications()
+    const result = await vitest.runTestSpecifications(specs, true)
+    const failed = result.unhandledErrors.length > 0 || result.testModules.some((m) => !m.ok())
+    console.log(`ELLA_WARM_RESULT ${failed ? 'fail' : 'pass'}`)
+  } catch (error) {
+    console.log(`ELLA_WARM_ERROR ${String(error?.message ?? error).split('\\n')[0]}`)
+  }
+}
+await vitest.close()
+"""
+
+
+def read_workspace_globs(root: Path) -> list[str]:
+    workspace_file = root / "pnpm-workspace.yaml"
+    if workspace_file.exists():
+        globs: list[str] = []
+        in_packages = False
+        for line in workspace_file.read_text(encoding="utf-8", errors="replace").splitlines():
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            if not line[0].isspace() and not stripped.startswith("-"):
+                key, _, rest = stripped.partition(":")
+                in_packages = key.strip() == "packages"
+                rest = rest.strip()
+                if in_packages and rest.startswith("["):
+                    globs.extend(x.strip().strip("'\"")
+                                 for x in rest.strip("[]").split(",") if x.strip())
+                continue
+            if in_packages and stripped.startswith("-"):
+                globs.append(stripped[1:].split(" #")[0].strip().strip("'\""))
+        return globs
+
+    try:
+        package = json.loads((root / "package.json").read_text(encoding="utf-8"))
+    except Exception:
+        return []
+    workspaces = package.get("workspaces") or []
+    if isinstance(workspaces, dict):
+        workspaces = workspaces.get("packages") or []
+    return [str(x) for x in workspaces if isinstance(x, str)]
+
+
+def load_workspace_packages(root: Path) -> dict[str, dict[str, Any]]:
+    included: set[Path] = set()
+    excluded: set[Path] = set()
+    for pattern in read_workspace_globs(root):
+        target = excluded if pattern.startswith("!") else included
+        for path in root.glob(pattern.lstrip("!").rstrip("/")):
+            if path.is_dir() and "node_modules" not in path.parts and (path / "package.json").exists():
+                target.add(path)
+
+    raw: dict[str, dict[str, Any]] = {}
+    for path in sorted(included - excluded):
+        try:
+            package = json.loads((path / "package.json").read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        name = str(package.get("name") or "").strip()
+        if not name:
+            continue
+        deps: set[str] = set()
+        for field in ["dependencies", "devDependencies", "peerDependencies", "optionalDependencies"]:
+            deps.update((package.get(field) or {}).keys())
+        raw[name] = {"dir": path.relative_to(root).as_posix(), "deps": deps}
+
+    return {
+        name: {"dir": info["dir"], "deps": sorted(dep for dep in info["deps"] if dep in raw and dep != name)}
+        for name, info in raw.items()
+    }
+
+
+def package_for_path(packages: dict[str, dict[str, Any]], path: str) -> str | None:
+    best: str | None = None
+    best_len = -1
+    for name, info in packages.items():
+        prefix = info["dir"] + "/"
+        if path.startswith(prefix) and len(prefix) > best_len:
+            best, best_len = name, len(prefix)
+    return best
+
+
+def affected_packages(packages: dict[str, dict[str, Any]], changed_files: list[str]) -> list[str] | None:
+    if not packages or not changed_files:
+        return None
+
+    touched: set[str] = set()
+    for path in changed_files:
+        name = package_for_path(packages, path.replace("\\", "/"))
+        if name is None:
+            return None
+        touched.add(name)
+
+    dependents: dict[str, set[str]] = {name: set() for name in packages}
+    for name, info in packages.items():
+        for dep in info["deps"]:
+            dependents[dep].add(name)
+
+    affected = set(touched)
+    queue = list(touched)
+    while queue:
+        for dependent in dependents[queue.pop()]:
+            if dependent not in affected:
+                affected.add(dependent)
+                queue.append(dependent)
+    return sorted(affected)
+
+
+RELATED_JS_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".mts", ".cts", ".vue", ".svelte")
+RELATED_FULL_SUITE_RE = re.compile(
+    r"(^|/)(package\.json|pnpm-lock\.yaml|package-lock\.json|yarn\.lock|tsconfig[\w.-]*\.json"
+    r"|vite(st)?\.[\w.-]+|conftest\.py|pytest\.ini|pyproject\.toml|setup\.(cfg|py)|tox\.ini"
+    r"|requirements[\w.-]*\.txt|\.env[\w.-]*)$")
+
+
+def python_module_names(rel: str) -> list[str]:
+    parts = rel[:-3].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    if not parts or not all(part.isidentifier() for part in parts):
+        return []
+    names = [".".join(parts)]
+    if parts[0] in {"src", "lib"} and len(parts) > 1:
+        names.append(".".join(parts[1:]))
+    return names
+
+
+def python_imports(text: str, module: str, is_package: bool) -> set[str]:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return set()
+    package = module.split(".") if is_package else module.split(".")[:-1]
+    imported: set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imported.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package[:len(package) - node.level + 1] if node.level <= len(package) + 1 else []
+                prefix = ".".join([*base, *(node.module.split(".") if node.module else [])])
+            else:
+                prefix = node.module or ""
+            if prefix:
+                imported.add(prefix)
+                imported.update(f"{prefix}.{alias.name}" for alias in node.names if alias.name != "*")
+    return imported
+
+
+def related_python_tests(sources: dict[str, str], changed: list[str]) -> list[str]:
+    modules: dict[str, str] = {}
+    for rel in sources:
+        for name in python_module_names(rel):
+            modules.setdefault(name, rel)
+
+    importers: dict[str, set[str]] = {rel: set() for rel in sources}
+    for rel, text in sources.items():
+        names = python_module_names(rel)
+        if not names:
+            continue
+        for imported in python_imports(text, names[0], rel.endswith("/__init__.py")):
+            parts = imported.split(".")
+            for end in range(1, len(parts) + 1):
+                target = modules.get(".".join(parts[:end]))
+                if target and target != rel:
+                    importers[target].add(rel)
+
+    affected = {rel for rel in changed if rel in sources}
+    queue = list(affected)
+    while queue:
+        for importer in importers[queue.pop()]:
+            if importer not in affected:
+                affected.add(importer)
+                queue.append(importer)
+    return sorted(rel for rel in affected
+                  if Path(rel).name.startswith("test_") or rel.endswith("_test.py"))
+
+
+class PatchError(Exception):
+    pass
+
+
+HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def split_text_lines(text: str) -> tuple[list[str], list[str], bool]:
+    parts = text.split("\n")
+    tail = parts.pop()
+    lines = [part[:-1] if part.endswith("\r") else part for part in parts]
+    eols = ["\r\n" if part.endswith("\r") else "\n" for part in parts]
+    if tail:
+        lines.append(tail)
+        eols.append("")
+    return lines, eols, text.endswith("\n")
+
+
+def join_text_lines(lines: list[str], eols: list[str], trailing_newline: bool) -> str:
+    if not lines:
+        return ""
+    default = "\r\n" if eols.count("\r\n") > eols.count("\n") else "\n"
+    endings = [eol or default for eol in eols]
+    endings[-1] = endings[-1] if trailing_newline else ""
+    return "".join(line + eol for line, eol in zip(lines, endings))
+
+
+def split_block_lines(text: str) -> list[str]:
+    return [line[:-1] if line.endswith("\r") else line for line in text.split("\n")]
+
+
+def parse_unified_hunks(patch: str) -> list[tuple[int, list[tuple[str, str]]]]:
+    hunks: list[tuple[int, list[tuple[str, str]]]] = []
+    current: list[tuple[str, str]] | None = None
+
+    for line in split_block_lines(patch.removesuffix("\n")):
+        match = HUNK_HEADER_RE.match(line)
+        if match:
+            current = []
+            hunks.append((int(match.group(1)), current))
+            continue
+        if current is None:
+            if line.startswith(("---", "+++", "diff ", "index ")) or not line.strip():
+                continue
+            raise PatchError(f"Unexpected line before the first @@ hunk header: {line[:120]}")
+        if line.startswith("\\"):
+            continue
+        if not line:
+            current.append((" ", ""))
+            continue
+        if line[0] not in " +-":
+            raise PatchError(f"Hunk line must start with a space, + or -: {line[:120]}")
+        current.append((line[0], line[1:]))
+
+    if not hunks:
+        raise PatchError("Patch does not contain any @@ hunk headers.")
+    return hunks
+
+
+def find_block(lines: list[str], block: list[str], expected: int, start: int) -> int:
+    if not block:
+        return min(max(expected, start), len(lines))
+
+    last = len(lines) - len(block)
+    if last < start:
+        return -1
+
+    positions = sorted(range(start, last + 1),
+                       key=lambda pos: abs(pos - expected))
+    for normalize in (lambda x: x, str.rstrip, lambda x: " ".join(x.split())):
+        wanted = [normalize(x) for x in block]
+        for pos in positions:
+            if all(normalize(lines[pos + i]) == wanted[i] for i in range(len(block))):
+                return pos
+    return -1
+
+
+def apply_unified_patch(original: str, patch: str) -> str:
+    lines, eols, trailing_newline = split_text_lines(original)
+    if not lines:
+        trailing_newline = True
+
+    offset = 0
+    cursor = 0
+    for index, (old_start, body) in enumerate(parse_unified_hunks(patch), start=1):
+        old_block = [text for kind, text in body if kind != "+"]
+        expected = max(old_start - 1, 0) + offset
+        pos = find_block(lines, old_block, expected, cursor)
+        if pos == -1:
+            raise PatchError(
+                f"Hunk {index} does not match the current file content near line {old_start}.")
+
+        replacement: list[str] = []
+        replacement_eols: list[str] = []
+        matched = iter(range(pos, pos + len(old_block)))
+        for kind, text in body:
+            if kind == " ":
+                line_no = next(matched)
+                replacement.append(lines[line_no])
+                replacement_eols.append(eols[line_no])
+            elif kind == "-":
+                next(matched)
+            else:
+                replacement.append(text)
+                replacement_eols.append("")
+
+        lines[pos: pos + len(old_block)] = replacement
+        eols[pos: pos + len(old_block)] = replacement_eols
+        cursor = pos + len(replacement)
+        offset += len(replacement) - len(old_block)
+
+    return join_text_lines(lines, eols, trailing_newline)
+
+
+def apply_search_replace(original: str, edits: list[Any]) -> str:
+    text = original
+    for index, edit in enumerate(edits, start=1):
+        if not isinstance(edit, dict) or not isinstance(edit.get("search"), str) or not isinstance(edit.get("replace"), str):
+            raise PatchError(
+                f"Edit {index} must be an object with search and replace strings.")
+        search = edit["search"]
+        replace = edit["replace"]
+        if not search.strip():
+            raise PatchError(f"Edit {index} has an empty search block.")
+
+        count = text.count(search)
+        if count == 1:
+            text = text.replace(search, replace, 1)
+            continue
+        if count > 1:
+            raise PatchError(
+                f"Edit {index} search block matches {count} places. Add more surrounding lines.")
+
+        lines, eols, trailing_newline = split_text_lines(text)
+        block = split_block_lines(search.strip("\r\n"))
+        wanted = [" ".join(x.split()) for x in block]
+        matches = [
+            pos for pos in range(len(lines) - len(block) + 1)
+            if all(" ".join(lines[pos + i].split()) == wanted[i] for i in range(len(block)))
+        ]
+        if len(matches) != 1:
+            reason = "does not match the current file content" if not matches else f"matches {len(matches)} places"
+            raise PatchError(f"Edit {index} search block {reason}.")
+
+        pos = matches[0]
+        new_lines = split_block_lines(replace.strip("\r\n")) if replace.strip("\r\n") else []
+        lines[pos: pos + len(block)] = new_lines
+        old_eols = eols[pos: pos + len(block)]
+        eols[pos: pos + len(block)] = [old_eols[i] if i < len(old_eols) else "" for i in range(len(new_lines))]
+        text = join_text_lines(lines, eols, trailing_newline)
+
+    return text
+
+
+def write_files_atomically(writes: dict[Path, str]) -> None:
+    originals: dict[Path, bytes | None] = {}
+    try:
+        for target, content in writes.items():
+            originals[target] = target.read_bytes() if target.exists() else None
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(f".{target.name}.ella-tmp")
+            tmp.write_text(content, encoding="utf-8")
+            if originals[target] is not None:
+                shutil.copymode(target, tmp)
+            os.replace(tmp, target)
+    except Exception:
+        for target, data in originals.items():
+            if data is None:
+                target.unlink(missing_ok=True)
+            else:
+                target.write_bytes(data)
+        raise
+
+
+def iter_response_lines(response: Any, limit: int, chunk_size: int = 65536) -> Iterator[bytes]:
+    buffer = bytearray()
+    received = 0
+    while True:
+        chunk = response.read1(chunk_size)
+        received += len(chunk)
+        if received > limit:
+            raise CommandError(f"AI response exceeded {limit} bytes. I aborted the stream.")
+        if not chunk:
+            if buffer:
+                yield bytes(buffer)
+            return
+        buffer += chunk
+        if b"\n" in chunk:
+            *lines, rest = buffer.split(b"\n")
+            buffer = bytearray(rest)
+            for line in lines:
+                yield line + b"\n"
+
+
+class SSEDecoder:
+    def __init__(self) -> None:
+        self.data_lines: list[str] = []
+
+    def feed(self, line: str) -> Iterator[Any]:
+        stripped = line.rstrip("\r\n")
+        if not stripped.strip():
+            yield from self.flush()
+            return
+        if stripped.startswith(":"):
+            return
+        if stripped.startswith("data:"):
+            payload = stripped[len("data:"):]
+            self.data_lines.append(payload[1:] if payload.startswith(" ") else payload)
+            return
+        if stripped.startswith(("event:", "id:", "retry:")):
+            return
+        try:
+            yield json.loads(stripped.strip())
+        except json.JSONDecodeError:
+            return
+
+    def flush(self) -> Iterator[Any]:
+        lines, self.data_lines = self.data_lines, []
+        payload = "\n".join(lines).strip()
+        if not payload or payload == "[DONE]":
+            return
+        try:
+            yield json.loads(payload)
+            return
+        except json.JSONDecodeError:
+            pass
+        for item in lines:
+            item = item.strip()
+            if not item or item == "[DONE]":
+                continue
+            try:
+                yield json.loads(item)
+            except json.JSONDecodeError:
+                continue
+
+
+class KeepAliveClient:
+    def __init__(self, base_url: str, *, pool_size: int, idle_timeout: int, timeout: int) -> None:
+        parsed = urllib.parse.urlsplit(base_url)
+        if parsed.scheme not in {"http", "https"} or not parsed.hostname:
+            raise CommandError("Endpoint URL must be an absolute http or https URL.")
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.netloc = parsed.netloc.rpartition("@")[2]
+        self.base_path = parsed.path.rstrip("/")
+        self.proxy: urllib.parse.SplitResult | None = None
+        self.proxy_headers: dict[str, str] = {}
+        proxy_url = urllib.request.getproxies().get(self.scheme, "")
+        if proxy_url and not urllib.request.proxy_bypass(self.netloc):
+            proxy = urllib.parse.urlsplit(proxy_url if "://" in proxy_url else f"http://{proxy_url}")
+            if proxy.hostname:
+                self.proxy = proxy
+            if proxy.hostname and proxy.username:
+                credentials = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+                self.proxy_headers["Proxy-Authorization"] = "Basic " + \
+                    base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+        self.idle: list[tuple[http.client.HTTPConnection, float]] = []
+        self.lock = threading.Lock()
+        self.timings: list[dict[str, Any]] = []
+
+    def new_connection(self) -> http.client.HTTPConnection:
+        if self.proxy is not None:
+            port = self.proxy.port or (443 if self.proxy.scheme == "https" else 80)
+            if self.scheme == "http":
+                return http.client.HTTPConnection(self.proxy.hostname, port, timeout=self.timeout)
+            conn = http.client.HTTPSConnection(
+                self.proxy.hostname, port, timeout=self.timeout, context=self.ssl_context)
+            conn.set_tunnel(self.host, self.port, headers=self.proxy_headers)
+            return conn
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self) -> tuple[http.client.HTTPConnection, bool]:
+        now = time.monotonic()
+        with self.lock:
+            while self.idle:
+                conn, idle_since = self.idle.pop()
+                if now - idle_since <= self.idle_timeout and conn.sock is not None:
+                    return conn, True
+                conn.close()
+        return self.new_connection(), False
+
+    def release(self, conn: http.client.HTTPConnection) -> None:
+        with self.lock:
+            if len(self.idle) < self.pool_size:
+                self.idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def send(
+        self,
+        conn: http.client.HTTPConnection,
+        reused: bool,
+        method: str,
+        path: str,
+        body: bytes | None,
+        headers: dict[str, str],
+        timing: dict[str, Any],
+    ) -> http.client.HTTPResponse:
+        timing["reused"] = reused
+        timing["connect_ms"] = 0
+        if not reused:
+            connect_started = time.monotonic()
+            try:
+                conn.connect()
+            except OSError as exc:
+                raise ConnectError(str(exc)) from exc
+            timing["connect_ms"] = int((time.monotonic() - connect_started) * 1000)
+        sent = time.monotonic()
+        target = self.base_path + path
+        if self.proxy is not None and self.scheme == "http":
+            target = f"http://{self.netloc}{target}"
+            headers = {**self.proxy_headers, **headers}
+        conn.request(method, target, body=body, headers=headers)
+        response = conn.getresponse()
+        timing["ttfb_ms"] = int((time.monotonic() - sent) * 1000)
+        timing["status"] = response.status
+        return response
+
+    @contextlib.contextmanager
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        body: bytes | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Iterator[tuple[http.client.HTTPResponse, dict[str, Any]]]:
+        headers = {"Connection": "keep-alive", **(headers or {})}
+        timing: dict[str, Any] = {"method": method, "path": path}
+        started = time.monotonic()
+        conn, reused = self.acquire()
+        response: http.client.HTTPResponse | None = None
+
+        try:
+            try:
+                response = self.send(conn, reused, method, path, body, headers, timing)
+            except (ConnectionError, http.client.BadStatusLine):
+                if not reused:
+                    raise
+                conn.close()
+                conn, reused = self.new_connection(), False
+                timing["stale_retry"] = True
+                response = self.send(conn, reused, method, path, body, headers, timing)
+
+            yield response, timing
+        finally:
+            timing["total_ms"] = int((time.monotonic() - started) * 1000)
+            with self.lock:
+                self.timings.append(timing)
+            if response is not None and not response.isclosed() and response.length == 0:
+                response.close()
+            if response is not None and response.isclosed() and not response.will_close:
+                self.release(conn)
+            else:
+                conn.close()
+
+
+class GitHubClient:
+    def __init__(self, token: str, api_url: str) -> None:
+        self.token = token
+        self.http = KeepAliveClient(
+            api_url, pool_size=GITHUB_POOL_SIZE, idle_timeout=GITHUB_POOL_IDLE_SECONDS, timeout=120)
+        self.etags: dict[str, tuple[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        self.http.close()
+
+    def backoff_seconds(self, method: str, status: int, headers: http.client.HTTPMessage, attempt: int) -> float | None:
+        retry_after = headers.get("Retry-After", "").strip()
+        rate_limited = status == 429 or (
+            status == 403 and (retry_after or headers.get("X-RateLimit-Remaining") == "0"))
+        if not rate_limited and (status < 500 or method not in GITHUB_IDEMPOTENT_METHODS):
+            return None
+        if retry_after.isdigit():
+            return float(retry_after)
+        reset = headers.get("X-RateLimit-Reset", "").strip()
+        if rate_limited and headers.get("X-RateLimit-Remaining") == "0" and reset.isdigit():
+            return max(float(reset) - time.time(), 1.0)
+        return float(2 ** attempt)
+
+    def api(
+        self,
+        method: str,
+        path: str,
+        *,
+        body: Any = None,
+        accept: str = "application/vnd.github+json",
+        check: bool = True,
+    ) -> Any:
+        headers = {
+            "Accept": accept,
+            "User-Agent": "ella-mizuki",
+            "X-GitHub-Api-Version": "2022-11-28",
+        }
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+
+        cache_key = f"{accept} {path}"
+        cached = None
+        if method == "GET":
+            with self.lock:
+                cached = self.etags.get(cache_key)
+            if cached:
+                headers["If-None-Match"] = cached[0]
+
+        for attempt in range(GITHUB_MAX_RETRIES + 1):
+            try:
+                with self.http.request(method, "/" + path.lstrip("/"), body=data, headers=headers) as (response, _):
+                    status = response.status
+                    response_headers = response.headers
+                    raw = response.read()
+            except (OSError, http.client.HTTPException) as exc:
+                retryable = isinstance(exc, ConnectError) or method in GITHUB_IDEMPOTENT_METHODS
+                if retryable and attempt < GITHUB_MAX_RETRIES:
+                    time.sleep(2 ** attempt)
+                    continue
+                if not check:
+                    return None
+                raise CommandError(f"GitHub API {method} {path} failed: {exc}")
+
+            if status >= 400 and attempt < GITHUB_MAX_RETRIES:
+                delay = self.backoff_seconds(method, status, response_headers, attempt)
+                if delay is not None:
+                    time.sleep(min(delay, GITHUB_MAX_BACKOFF_SECONDS))
+                    continue
+            break
+
+        if status == 304 and cached:
+            return cached[1]
+
+        text = raw.decode("utf-8", errors="replace")
+        if status >= 400:
+            if check:
+                raise CommandError(
+                    f"GitHub API {method} {path} failed with HTTP status {status}.\n{text[:2000]}")
+            return None
+
+        if not text:
+            value: Any = None
+        elif "json" in response_headers.get("Content-Type", ""):
+            value = json.loads(text)
+        else:
+            value = text
+
+        etag = response_headers.get("ETag")
+        if method == "GET" and etag:
+            with self.lock:
+                self.etags[cache_key] = (etag, value)
+        return value
+
+    def paginate(self, path: str, *, limit: int = 3000) -> list[Any]:
+        items: list[Any] = []
+        separator = "&" if "?" in path else "?"
+        page = 1
+        while len(items) < limit:
+            batch = self.api("GET", f"{path}{separator}per_page=100&page={page}")
+            if not isinstance(batch, list):
+                break
+            items.extend(batch)
+            if len(batch) < 100:
+                break
+            page += 1
+        return items[:limit]
+
+
+def issue_info_from_api(issue: dict[str, Any]) -> dict[str, Any]:
+    user = issue.get("user") or {}
+    return {
+        "title": issue.get("title") or "",
+        "body": issue.get("body") or "",
+        "author": {
+            "id": user.get("node_id", ""),
+            "is_bot": user.get("type") == "Bot",
+            "login": user.get("login", ""),
+            "name": user.get("name") or "",
+        },
+        "url": issue.get("html_url", ""),
+        "number": issue.get("number"),
+        "state": str(issue.get("state", "")).upper(),
+    }
+
+
+def pr_info_from_api(pr: dict[str, Any]) -> dict[str, Any]:
+    head_repo = pr["head"].get("repo") or {}
+    base_repo = pr["base"].get("repo") or {}
+    return {
+        **issue_info_from_api(pr),
+        "baseRefName": pr["base"]["ref"],
+        "headRefName": pr["head"]["ref"],
+        "headRepository": {"name": head_repo.get("name", "")},
+        "headRepositoryOwner": {"login": (head_repo.get("owner") or {}).get("login", "")},
+        "isCrossRepository": head_repo.get("full_name") != base_repo.get("full_name"),
+        "isDraft": bool(pr.get("draft")),
+        "state": "MERGED" if pr.get("merged_at") else str(pr.get("state", "")).upper(),
+    }
+
+
+GITHUB_CLIENT: GitHubClient | None = None
+GITHUB_CLIENT_LOCK = threading.Lock()
+
+
+def github_client() -> GitHubClient:
+    global GITHUB_CLIENT
+    with GITHUB_CLIENT_LOCK:
+        if GITHUB_CLIENT is None:
+            token = os.environ.get("GH_TOKEN", "").strip() or os.environ.get("GITHUB_TOKEN", "").strip()
+            GITHUB_CLIENT = GitHubClient(token, GITHUB_API_URL)
+        return GITHUB_CLIENT
+
+
+class ProgressUpdater:
+    def __init__(self, send: Callable[[str], None], min_interval: float) -> None:
+        self.send = send
+        self.min_interval = min_interval
+        self.pending: str | None = None
+        self.closed = False
+        self.last_sent = 0.0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(
+            target=self.loop, name="ella-progress", daemon=True)
+        self.thread.start()
+
+    def submit(self, body: str) -> None:
+        with self.condition:
+            self.pending = body
+            self.condition.notify()
+
+    def loop(self) -> None:
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                delay = self.last_sent + self.min_interval - time.monotonic()
+                if delay > 0 and not self.closed:
+                    self.condition.wait(delay)
+                    continue
+                body, self.pending = self.pending, None
+
+            try:
+                self.send(body)
+            except Exception:
+                pass
+            self.last_sent = time.monotonic()
+
+    def close(self, timeout: float = 30) -> None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join(timeout)
+
+
+class WarmCheck:
+    def __init__(self, name: str, kind: str, cmd: list[str], log_path: Path) -> None:
+        self.name = name
+        self.kind = kind
+        self.cmd = cmd
+        self.log_path = log_path
+        self.lines: list[str] = []
+        self.condition = threading.Condition()
+        self.proc: subprocess.Popen[str] | None = None
+        self.last_tree: str | None = None
+        self.last_result: tuple[bool, str] | None = None
+        self.last_changed: set[str] = set()
+        self.consumed = 0
+
+    def start(self) -> None:
+        self.proc = subprocess.Popen(
+            self.cmd,
+            cwd=ROOT,
+            text=True,
+            stdin=subprocess.PIPE if self.kind == "vitest" else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=clean_env_for_checks(),
+            start_new_session=True,
+        )
+        threading.Thread(target=self.read_output, name=f"ella-warm-{self.name}", daemon=True).start()
+
+    def read_output(self) -> None:
+        assert self.proc is not None and self.proc.stdout is not None
+        with self.log_path.open("w", encoding="utf-8", errors="replace") as log:
+            for raw in self.proc.stdout:
+                line = ANSI_RE.sub("", raw.rstrip("\n"))
+                log.write(line + "\n")
+                log.flush()
+                with self.condition:
+                    self.lines.append(line)
+                    self.condition.notify_all()
+        with self.condition:
+            self.condition.notify_all()
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def query(self, tree: str, changed: set[str], timeout: int,
+              cancel: threading.Event | None) -> tuple[bool, str] | None:
+        if not self.alive():
+            return None
+        if tree == self.last_tree and self.last_result is not None:
+            return self.last_result
+        if self.kind == "vitest":
+            result = self.query_vitest(changed, timeout, cancel)
+        else:
+            result = self.query_tsc(timeout, cancel)
+        if result is None:
+            if not (cancel is not None and cancel.is_set()):
+                self.close()
+            return None
+        self.last_tree, self.last_result, self.last_changed = tree, result, changed
+        return result
+
+    def query_tsc(self, timeout: int, cancel: threading.Event | None) -> tuple[bool, str] | None:
+        start = time.monotonic()
+        with self.condition:
+            while True:
+                starts = [i for i, line in enumerate(self.lines) if TSC_START_RE.search(line)]
+                results = [i for i, line in enumerate(self.lines) if TSC_RESULT_RE.search(line)]
+                busy = bool(starts) and (not results or results[-1] < starts[-1])
+                elapsed = time.monotonic() - start
+                if results and not busy and elapsed >= WARM_CHECK_SETTLE_SECONDS:
+                    break
+                if not self.alive() or elapsed >= timeout or (cancel is not None and cancel.is_set()):
+                    return None
+                self.condition.wait(0.5)
+            first = max((i for i in starts if i < results[-1]), default=0)
+            block = self.lines[first:results[-1] + 1]
+            errors = int(TSC_RESULT_RE.search(self.lines[results[-1]]).group(1))
+        return errors == 0, "\n".join(block[-120:])
+
+    def query_vitest(self, changed: set[str], timeout: int,
+                     cancel: threading.Event | None) -> tuple[bool, str] | None:
+        assert self.proc is not None and self.proc.stdin is not None
+        with self.condition:
+            begin = len(self.lines)
+        try:
+            paths = sorted(str(ROOT / rel) for rel in changed | self.last_changed)
+            self.proc.stdin.write(json.dumps(paths) + "\n")
+            self.proc.stdin.flush()
+        except OSError:
+            return None
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                marker = next((i for i in range(begin, len(self.lines))
+                               if self.lines[i].startswith(("ELLA_WARM_RESULT ", "ELLA_WARM_ERROR "))), None)
+                if marker is not None:
+                    break
+                if not self.alive() or time.monotonic() >= deadline or (cancel is not None and cancel.is_set()):
+                    return None
+                self.condition.wait(0.5)
+            if self.lines[marker].startswith("ELLA_WARM_ERROR "):
+                return None
+            block = self.lines[begin:marker]
+        return self.lines[marker].endswith(" pass"), "\n".join(block[-120:])
+
+    def close(self) -> None:
+        if self.proc is None:
+            return
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except OSError:
+            self.proc.kill()
+        self.proc.wait()
+
+
 class Ella:
     def __init__(self) -> None:
         event_path = os.environ.get("GITHUB_EVENT_PATH")
@@ -300,22 +1838,54 @@ class Ella:
         self.mode = "unknown"
         self.prompt = ""
         self.progress_comment_id: str | None = None
+        self.progress_updater: ProgressUpdater | None = None
         self.pr_info: dict[str, Any] | None = None
         self.issue_info: dict[str, Any] | None = None
         self.allowed_files: list[str] = []
-        self.ignore_patterns = load_ignore_patterns()
+        self.ignore_patterns = IgnoreMatcher(load_ignore_patterns())
 
         self.ai_base_url = os.environ.get("ELLA_AI_BASE_URL", "").strip()
         self.ai_model = os.environ.get("ELLA_AI_MODEL", "").strip()
         self.ai_api_key = os.environ.get("ELLA_AI_API_KEY", "").strip()
+        self.ai_client: KeepAliveClient | None = None
+        self.ai_stream_usage = True
+        self.github = github_client()
 
         self.commit_name = os.environ.get("YURI_COMMIT_NAME", "").strip()
         self.commit_email = os.environ.get("YURI_COMMIT_EMAIL", "").strip()
 
         self.feedback = ""
-        self.extra_context = ""
+        self.context_ledger: dict[str, dict[str, Any]] = {}
+        self.last_fix_prompt = ""
+        self.prompt_cache_rows: list[str] = []
+        self.conversation: list[dict[str, str]] = []
+        self.preselected_files: list[str] = []
+        self.file_cache: dict[tuple[str, int], tuple[int, int, str]] = {}
+        self.file_cache_lock = threading.Lock()
+        self.search_index: tuple[str, TrigramIndex] | None = None
+        self.search_lock = threading.Lock()
+        self.check_results: dict[str, tuple[bool, str]] = {}
+        self.toolchain_versions: dict[str, str] = {}
+        self.check_cache_lock = threading.Lock()
+        self.symbol_summary = ""
+        self.conversation_rows: list[str] = []
+        self.conversation_file_hashes_sent: dict[str, str] = {}
+        self.conversation_ledger_sent: dict[str, str] = {}
+        self.pending_file_hashes: dict[str, str] = {}
+        self.pending_ledger_hashes: dict[str, str] = {}
+        self.workspace_packages: dict[str, dict[str, Any]] | None = None
+        self.worktree_lock = threading.Lock()
+        self.warm_checks: dict[str, WarmCheck] = {}
         self.final_summary = ""
 
+    def close(self) -> None:
+        self.stop_warm_checks()
+        if self.progress_updater:
+            self.progress_updater.close()
+        if self.ai_client:
+            self.ai_client.close()
+        self.github.close()
+
     def run(self) -> None:
         self.mask_secrets()
         self.react("eyes")
@@ -381,7 +1951,12 @@ class Ella:
                 f"Status: preparing context.\n"
                 f"Limit: {MAX_ATTEMPTS} attempts / {TIME_LIMIT_SECONDS // 60} minutes."
             )
-            success = self.fix_loop()
+            self.restore_build_caches()
+            try:
+                success = self.fix_loop()
+            finally:
+                self.stop_warm_checks()
+                self.save_build_caches()
             if success:
                 commit_sha = self.commit_and_push_fix()
                 self.comment(
@@ -397,12 +1972,18 @@ class Ella:
             self.checkout_solve_branch()
             self.load_repo_instructions()
             self.allowed_files = self.get_repo_files()
+            self.preselect_from_symbol_index()
             self.create_progress_comment(
                 "👀 I started working on this issue.\n\n"
                 f"Status: preparing branch and context.\n"
                 f"Limit: {MAX_ATTEMPTS} attempts / {TIME_LIMIT_SECONDS // 60} minutes."
             )
-            success = self.fix_loop()
+            self.restore_build_caches()
+            try:
+                success = self.fix_loop()
+            finally:
+                self.stop_warm_checks()
+                self.save_build_caches()
             if success:
                 commit_sha = self.commit_and_push_solve()
                 pr_url = self.create_solve_pr()
@@ -507,76 +2088,57 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
 
     def react(self, content: str) -> None:
         try:
-            gh([
-                "api",
-                "--method",
+            self.github.api(
                 "POST",
                 f"repos/{self.repo}/issues/comments/{self.comment_id}/reactions",
-                "-H",
-                "Accept: application/vnd.github+json",
-                "-f",
-                f"content={content}",
-            ], check=False)
+                body={"content": content},
+                check=False,
+            )
         except Exception:
             pass
 
     def comment(self, body: str) -> None:
-        gh(["issue", "comment", str(self.issue_number),
-           "--repo", self.repo, "--body", body])
+        self.github.api(
+            "POST", f"repos/{self.repo}/issues/{self.issue_number}/comments", body={"body": body})
 
     def create_progress_comment(self, body: str) -> None:
-        out = gh([
-            "api",
-            "--method",
-            "POST",
-            f"repos/{self.repo}/issues/{self.issue_number}/comments",
-            "-f",
-            f"body={body}",
-            "--jq",
-            ".id",
-        ])
-        self.progress_comment_id = out.strip()
+        created = self.github.api(
+            "POST", f"repos/{self.repo}/issues/{self.issue_number}/comments", body={"body": body})
+        self.progress_comment_id = str(created["id"])
 
     def update_progress(self, body: str) -> None:
         if not self.progress_comment_id:
             return
-        gh([
-            "api",
-            "--method",
-            "PATCH",
-            f"repos/{self.repo}/issues/comments/{self.progress_comment_id}",
-            "-f",
-            f"body={body}",
-        ], check=False)
+        if self.progress_updater is None:
+            self.progress_updater = ProgressUpdater(
+                self.send_progress, PROGRESS_MIN_INTERVAL_SECONDS)
+        self.progress_updater.submit(body)
+
+    def send_progress(self, body: str) -> None:
+        try:
+            self.github.api(
+                "PATCH",
+                f"repos/{self.repo}/issues/comments/{self.progress_comment_id}",
+                body={"body": body},
+                check=False,
+            )
+        except Exception:
+            pass
 
     def load_pr_metadata(self) -> None:
-        raw = gh([
-            "pr",
-            "view",
-            str(self.issue_number),
-            "--repo",
-            self.repo,
-            "--json",
-            "title,body,author,baseRefName,headRefName,headRepository,headRepositoryOwner,isCrossRepository,isDraft,state,url",
-        ])
-        self.pr_info = json.loads(raw)
+        pr = self.github.api("GET", f"repos/{self.repo}/pulls/{self.issue_number}")
+        self.pr_info = pr_info_from_api(pr)
         write_debug("pr-info.json", json.dumps(self.pr_info, indent=2))
 
-        diff = gh(["pr", "diff", str(self.issue_number), "--repo", self.repo])
+        diff = self.github.api(
+            "GET", f"repos/{self.repo}/pulls/{self.issue_number}", accept="application/vnd.github.diff")
+        diff = diff if isinstance(diff, str) else ""
         write_debug("pr-diff.txt", diff)
         write_debug("pr-diff-limited.txt", diff[:MAX_CONTEXT_PR_DIFF_BYTES])
 
     def load_issue_metadata(self) -> None:
-        raw = gh([
-            "issue",
-            "view",
-            str(self.issue_number),
-            "--repo",
-            self.repo,
-            "--json",
-            "title,body,author,url,number,state",
-        ])
-        self.issue_info = json.loads(raw)
+        issue = self.github.api("GET", f"repos/{self.repo}/issues/{self.issue_number}")
+        self.issue_info = issue_info_from_api(issue)
         write_debug("issue-info.json", json.dumps(self.issue_info, indent=2))
 
     def checkout_pr_branch(self) -> None:
@@ -600,9 +2162,9 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
         git(["checkout", "-B", branch])
 
     def get_pr_changed_files(self) -> list[str]:
-        raw = gh(["pr", "diff", str(self.issue_number),
-                 "--repo", self.repo, "--name-only"])
-        files = [line.strip() for line in raw.splitlines() if line.strip()]
+        entries = self.github.paginate(f"repos/{self.repo}/pulls/{self.issue_number}/files")
+        files = [str(entry.get("filename", "")).strip() for entry in entries if isinstance(entry, dict)]
+        files = [f for f in files if f]
         files = [f for f in files if safe_rel_path(
             f) and not is_ignored(f, self.ignore_patterns)]
         write_debug("allowed-files.txt", "\n".join(files) + "\n")
@@ -618,6 +2180,99 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
                     "\n")[:MAX_CONTEXT_REPO_FILES_BYTES])
         return files
 
+    def load_symbol_index(self) -> dict[str, dict[str, Any]]:
+        tree = git(["rev-parse", "HEAD^{tree}"]).strip()
+        store = CACHE_DIR / "symbol-index"
+        cache_path = store / f"{tree}.json"
+        try:
+            files = json.loads(cache_path.read_text(encoding="utf-8"))["files"]
+            os.utime(cache_path)
+            write_debug("symbol-index.md", f"Symbol index for tree {tree}: cache hit, {len(files)} files.\n")
+            return files
+        except Exception:
+            pass
+
+        previous: dict[str, dict[str, Any]] = {}
+        older = sorted(store.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in older[:1]:
+            try:
+                previous = json.loads(path.read_text(encoding="utf-8"))["files"]
+            except Exception:
+                previous = {}
+
+        if self.workspace_packages is None:
+            self.workspace_packages = load_workspace_packages(ROOT)
+        roots = [info["dir"] + "/" for info in self.workspace_packages.values()]
+
+        files: dict[str, dict[str, Any]] = {}
+        rescanned = 0
+        for line in git(["ls-tree", "-r", "HEAD"]).splitlines():
+            meta, _, rel = line.partition("\t")
+            parts = meta.split()
+            if len(parts) != 3 or parts[1] != "blob":
+                continue
+            if Path(rel).suffix not in SYMBOL_INDEX_EXTENSIONS or is_ignored(rel, self.ignore_patterns):
+                continue
+            if roots and not rel.startswith(tuple(roots)):
+                continue
+            blob = parts[2]
+            cached = previous.get(rel)
+            if cached and cached.get("blob") == blob:
+                files[rel] = cached
+                continue
+            path = ROOT / rel
+            if not path.is_file() or path.stat().st_size > 1_000_000:
+                continue
+            files[rel] = {"blob": blob, **scan_source_file(rel, read_text_limited(path, 1_000_000))}
+            rescanned += 1
+
+        try:
+            store.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"tree": tree, "files": files}), encoding="utf-8")
+            tmp.replace(cache_path)
+            for stale in older[SYMBOL_INDEX_KEEP - 1:]:
+                stale.unlink(missing_ok=True)
+        except OSError as exc:
+            print(f"Could not save the symbol index: {exc}")
+
+        write_debug(
+            "symbol-index.md",
+            f"Symbol index for tree {tree}: {len(files)} files, {rescanned} scanned, "
+            f"{len(files) - rescanned} reused from the previous index.\n")
+        return files
+
+    def preselect_from_symbol_index(self) -> None:
+        try:
+            index = self.load_symbol_index()
+        except Exception as exc:
+            write_debug("symbol-index.md", f"Symbol index failed: {exc}\n")
+            return
+
+        info = self.issue_info or {}
+        text = "\n".join([str(info.get("title", "")), str(info.get("body", "")), self.prompt])
+        identifiers, words = issue_terms(text)
+        scored = sorted(
+            ((score_index_entry(rel, entry, text, identifiers, words), rel) for rel, entry in index.items()),
+            key=lambda item: (-item[0], item[1]),
+        )
+        scored = [(score, rel) for score, rel in scored if score > 0]
+        self.preselected_files = [rel for _, rel in scored[:SOLVE_PRESELECT_FILES]]
+
+        lines: list[str] = []
+        for score, rel in scored[:40]:
+            entry = index[rel]
+            fields = [f"symbols: {', '.join(entry['symbols'][:20])}"] if entry.get("symbols") else []
+            if entry.get("routes"):
+                fields.append(f"routes: {', '.join(entry['routes'][:5])}")
+            lines.append(f"{rel} ({'; '.join(fields) or 'no exports'})")
+        self.symbol_summary = "\n".join(lines)
+
+        report = ["Files matched against the issue text:", ""]
+        report.extend(f"- {rel} (score {score}){' preselected' if rel in self.preselected_files else ''}"
+                      for score, rel in scored[:40])
+        write_debug("symbol-matches.md", "\n".join(report) + "\n")
+
     def load_repo_instructions(self) -> None:
         chunks: list[str] = []
         for rel in [
@@ -720,22 +2375,12 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
             self.react("confused")
             return
 
-        for item in labels_config:
-            gh([
-                "label",
-                "create",
-                item["name"],
-                "--repo",
-                self.repo,
-                "--color",
-                item.get("color", "ededed"),
-                "--description",
-                item.get("description", ""),
-            ], check=False)
-
-        for name in picked:
-            gh(["issue", "edit", str(self.issue_number), "--repo",
-               self.repo, "--add-label", labels_by_name[name]["name"]])
+        self.sync_labels(labels_config)
+        self.github.api(
+            "POST",
+            f"repos/{self.repo}/issues/{self.issue_number}/labels",
+            body={"labels": [labels_by_name[name]["name"] for name in picked]},
+        )
 
         summary = str(data.get("summary")
                       or "I applied the most relevant labels.").strip()
@@ -744,81 +2389,141 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
         self.comment(
             f"I applied these labels: {', '.join(labels_by_name[name]['name'] for name in picked)}\n\n{summary}")
 
-    def ai_call(self, context: str, system_prompt: str, max_tokens: int, allow_retry: bool = True) -> str:
+    def sync_labels(self, labels_config: list[dict[str, str]]) -> None:
+        cache_path = CACHE_DIR / "labels" / \
+            (re.sub(r"[^a-zA-Z0-9_.-]+", "__", self.repo) + ".json")
+        known: set[str] = set()
+        cache_hit = False
+        try:
+            cached = json.loads(cache_path.read_text(encoding="utf-8"))
+            if time.time() - float(cached.get("fetched", 0)) < LABEL_CACHE_TTL_SECONDS:
+                known = {str(x).lower() for x in cached.get("labels", [])}
+                cache_hit = True
+        except Exception:
+            pass
+
+        wanted = {item["name"].lower() for item in labels_config}
+        if not cache_hit or not wanted <= known:
+            existing = self.github.paginate(f"repos/{self.repo}/labels")
+            known = {str(label.get("name", "")).lower() for label in existing if isinstance(label, dict)}
+            fetched = time.time()
+        else:
+            fetched = float(cached.get("fetched", time.time()))
+
+        created: list[str] = []
+        for item in labels_config:
+            if item["name"].lower() in known:
+                continue
+            result = self.github.api(
+                "POST",
+                f"repos/{self.repo}/labels",
+                body={
+                    "name": item["name"],
+                    "color": item.get("color", "ededed"),
+                    "description": item.get("description", ""),
+                },
+                check=False,
+            )
+            if result is not None:
+                known.add(item["name"].lower())
+                created.append(item["name"])
+
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_text(json.dumps(
+                {"fetched": fetched, "labels": sorted(known)}, indent=2), encoding="utf-8")
+        except OSError:
+            pass
+        write_debug("label-sync.json", json.dumps(
+            {"cache_hit": cache_hit, "created": created, "known": sorted(known)}, indent=2))
+
+    def ai_call(
+        self,
+        context: str | list[str],
+        system_prompt: str,
+        max_tokens: int,
+        allow_retry: bool = True,
+        on_delta: Callable[[str], None] | None = None,
+        temperature: float = 0,
+        out: Path = OUT,
+        history: list[dict[str, str]] | None = None,
+    ) -> str:
         body = {
             "model": self.ai_model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": context},
-            ],
-            "temperature": 0,
+            "messages": self.build_ai_messages(context, system_prompt, history),
+            "temperature": temperature,
             "max_tokens": max_tokens,
             "stream": True,
             "tools": [],
             "tool_choice": "none",
         }
+        if self.ai_stream_usage:
+            body["stream_options"] = {"include_usage": True}
 
         data = json.dumps(body).encode("utf-8")
-        url = self.ai_base_url.rstrip("/") + "/chat/completions"
-
-        request = urllib.request.Request(
-            url,
-            data=data,
-            method="POST",
-            headers={
-                "Authorization": f"Bearer {self.ai_api_key}",
-                "Content-Type": "application/json",
-                "Accept": "application/json, text/event-stream",
-                "Cache-Control": "no-cache",
-                "User-Agent": "curl/8.7.1",
-            },
-        )
+        headers = {
+            "Authorization": f"Bearer {self.ai_api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json, text/event-stream",
+            "Cache-Control": "no-cache",
+            "User-Agent": "curl/8.7.1",
+        }
 
         content_parts: list[str] = []
         tool_call_seen = False
-        raw_lines: list[str] = []
+        client = self.get_ai_client()
+
+        def emit(text: str) -> None:
+            content_parts.append(text)
+            if on_delta:
+                on_delta(text)
 
         try:
-            with urllib.request.urlopen(request, timeout=900) as response:
-                status = getattr(response, "status", 200)
-                print(f"HTTP status: {status}")
-
-                for raw in response:
-                    line = raw.decode("utf-8", errors="replace")
-                    raw_lines.append(line)
-
-                    stripped = line.strip()
-                    if not stripped or stripped.startswith(":"):
-                        continue
-
-                    if stripped.startswith("data:"):
-                        payload = stripped[len("data:"):].strip()
-                        if not payload or payload == "[DONE]":
-                            continue
-                        try:
-                            obj = json.loads(payload)
-                        except json.JSONDecodeError:
-                            continue
-                        if self.collect_ai_choices(obj, content_parts):
-                            tool_call_seen = True
-                    else:
-                        try:
-                            obj = json.loads(stripped)
-                        except json.JSONDecodeError:
-                            continue
-                        if self.collect_ai_choices(obj, content_parts):
+            with client.request("POST", "/chat/completions", body=data, headers=headers) as (response, timing):
+                status = response.status
+                print(
+                    f"HTTP status: {status} (connect {timing['connect_ms']}ms, ttfb {timing['ttfb_ms']}ms, reused={timing['reused']})")
+
+                if status >= 300:
+                    detail = response.read(AI_MAX_RESPONSE_BYTES).decode(
+                        "utf-8", errors="replace")
+                    write_debug("response.stream", detail, out)
+                    if status in {400, 422} and "stream_options" in body and (
+                            "stream_options" in detail or "include_usage" in detail):
+                        print("The AI endpoint rejected stream_options. Retrying without usage reporting.")
+                        self.ai_stream_usage = False
+                        return self.ai_call(context, system_prompt, max_tokens, allow_retry, on_delta,
+                                            temperature, out, history)
+                    location = response.headers.get("Location")
+                    raise CommandError(
+                        f"AI endpoint failed with HTTP status {status}."
+                        + (f" Redirects are not followed; set ELLA_AI_BASE_URL to {location}." if location else ""))
+
+                decoder = SSEDecoder()
+                with (out / "response.stream").open("w", encoding="utf-8", errors="replace") as stream_log:
+                    try:
+                        for raw in iter_response_lines(response, AI_MAX_RESPONSE_BYTES):
+                            line = raw.decode("utf-8", errors="replace")
+                            stream_log.write(line)
+                            for obj in decoder.feed(line):
+                                if self.collect_ai_choices(obj, emit):
+                                    tool_call_seen = True
+                                if isinstance(obj, dict) and obj.get("usage"):
+                                    timing["usage"] = obj["usage"]
+                    except CommandError as exc:
+                        stream_log.write(f"\n[aborted: {exc}]\n")
+                        raise
+
+                    for obj in decoder.flush():
+                        if self.collect_ai_choices(obj, emit):
                             tool_call_seen = True
+                        if isinstance(obj, dict) and obj.get("usage"):
+                            timing["usage"] = obj["usage"]
 
-        except urllib.error.HTTPError as exc:
-            detail = exc.read().decode("utf-8", errors="replace")
-            write_debug("response.stream", detail)
-            raise CommandError(
-                f"AI endpoint failed with HTTP status {exc.code}.")
-        except urllib.error.URLError as exc:
-            raise CommandError(f"AI endpoint request failed: {exc.reason}")
-
-        raw_text = "".join(raw_lines)
-        write_debug("response.stream", raw_text)
+        except (OSError, http.client.HTTPException) as exc:
+            raise CommandError(f"AI endpoint request failed: {exc}")
+        finally:
+            write_debug("ai-timings.json", json.dumps(client.timings, indent=2), out)
 
         content = "".join(content_parts).strip()
         if content:
@@ -829,13 +2534,15 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
                 "empty-content-retry.txt",
                 "The first response did not contain visible content. Retrying once with tool calls disabled and a stricter prompt.\n"
                 f"tool_call_seen={tool_call_seen}\n",
+                out,
             )
             retry_system_prompt = (
                 system_prompt
                 + "\n\nImportant: do not call tools, do not use function calls, do not expose reasoning, "
                 + "and return only the final visible answer in normal assistant message content."
             )
-            return self.ai_call(context, retry_system_prompt, max_tokens, allow_retry=False)
+            return self.ai_call(context, retry_system_prompt, max_tokens, allow_retry=False,
+                                on_delta=on_delta, temperature=temperature, out=out, history=history)
 
         reason = "The model did not return visible message content."
         if tool_call_seen:
@@ -843,7 +2550,47 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
         raise CommandError(reason)
 
     @staticmethod
-    def collect_ai_choices(obj: Any, content_parts: list[str]) -> bool:
+    def build_ai_messages(
+        context: str | list[str],
+        system_prompt: str,
+        history: list[dict[str, str]] | None = None,
+    ) -> list[dict[str, Any]]:
+        if isinstance(context, str):
+            context = [context]
+        history = list(history or [])
+        if not AI_CACHE_CONTROL:
+            return [
+                {"role": "system", "content": system_prompt},
+                *history,
+                {"role": "user", "content": "".join(context)},
+            ]
+
+        parts: list[dict[str, Any]] = [{"type": "text", "text": text} for text in context if text]
+        for part in parts[:-1]:
+            part["cache_control"] = {"type": "ephemeral"}
+        if history:
+            last = history[-1]
+            history[-1] = {"role": last["role"], "content": [
+                {"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}]}
+        return [
+            {"role": "system", "content": [
+                {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]},
+            *history,
+            {"role": "user", "content": parts},
+        ]
+
+    def get_ai_client(self) -> KeepAliveClient:
+        if self.ai_client is None:
+            self.ai_client = KeepAliveClient(
+                self.ai_base_url,
+                pool_size=AI_POOL_SIZE,
+                idle_timeout=AI_POOL_IDLE_SECONDS,
+                timeout=AI_REQUEST_TIMEOUT_SECONDS,
+            )
+        return self.ai_client
+
+    @staticmethod
+    def collect_ai_choices(obj: Any, emit: Callable[[str], None]) -> bool:
         if not isinstance(obj, dict):
             return False
 
@@ -861,7 +2608,7 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
 
             content = delta.get("content") or message.get("content") or choice.get("text")
             if content:
-                content_parts.append(str(content))
+                emit(str(content))
 
         return tool_call_seen
 
@@ -881,6 +2628,8 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
                 "❌ I stopped before editing.\n\nReason: install failed.\nA debug artifact will be uploaded if available.")
             return False
 
+        self.start_warm_checks()
+
         while attempt <= MAX_ATTEMPTS:
             elapsed = int(time.time() - start)
             if elapsed >= TIME_LIMIT_SECONDS:
@@ -904,20 +2653,34 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
                 f"Time used: {elapsed}s/{TIME_LIMIT_SECONDS}s"
             )
 
-            context = self.build_fix_context(attempt)
+            self.prune_ledger()
+            if CONVERSATION_MODE:
+                context = self.build_conversation_turn(attempt)
+            else:
+                context = self.build_fix_context(attempt)
             system = self.system_prompt_for_fix()
 
-            try:
-                response = self.ai_call(context, system, MAX_TOKENS[self.mode])
-                write_debug("ai-response.txt", response)
-            except Exception as exc:
-                self.feedback = f"Failure type: ai_endpoint\n\n{exc}"
+            (OUT / "retrieved-requests.json").unlink(missing_ok=True)
+            if FIX_CANDIDATES > 1:
+                outcome, detail = self.run_candidates(attempt, context, system)
+            else:
+                outcome, detail = self.run_single_attempt(attempt, context, system)
+
+            retrieved = OUT / "retrieved-requests.json"
+            if retrieved.exists():
+                self.add_to_ledger(json.loads(retrieved.read_text(encoding="utf-8")))
+
+            if CONVERSATION_MODE and outcome not in {"ai_endpoint", "cancelled"}:
+                self.remember_turn(context, (OUT / "ai-response.txt").read_text(
+                    encoding="utf-8", errors="replace"))
+
+            if outcome == "ai_endpoint":
+                self.feedback = f"Failure type: ai_endpoint\n\n{detail}"
                 write_debug("feedback.txt", self.feedback)
                 attempt += 1
                 continue
 
-            status = self.apply_ai_response(response)
-            if status == "needs_files":
+            if outcome == "needs_files":
                 self.append_needed_files_context()
                 self.feedback = f"Failure type: needs_more_files\n\nAttempt {attempt} requested more files. I provided the valid requested files."
                 write_debug("feedback.txt", self.feedback)
@@ -926,7 +2689,7 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
                 attempt += 1
                 continue
 
-            if status != "ok":
+            if outcome == "apply_error":
                 self.feedback = f"Attempt {attempt} returned invalid or non-applicable JSON.\n\n" + (
                     OUT / "apply-error.txt").read_text(encoding="utf-8", errors="replace")
                 write_debug("feedback.txt", self.feedback)
@@ -935,21 +2698,16 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
                 attempt += 1
                 continue
 
-            diff_check = run_cmd(["git", "diff", "--check"],
-                                 capture=True, check=False)
-            write_debug("diff-check.txt", diff_check.stdout or "")
-            if diff_check.returncode != 0:
-                self.feedback = f"Failure type: diff_check_failed\n\nAttempt {attempt} failed git diff --check.\n\n{diff_check.stdout}"
+            if outcome == "diff_check_failed":
+                self.feedback = f"Failure type: diff_check_failed\n\nAttempt {attempt} failed git diff --check.\n\n" + (
+                    OUT / "diff-check.txt").read_text(encoding="utf-8", errors="replace")
                 write_debug("feedback.txt", self.feedback)
                 self.update_progress(
                     f"⚠️ I applied changes, but they failed git diff --check.\n\nAttempt: {attempt}/{MAX_ATTEMPTS}\nNext step: fix formatting or whitespace.")
                 attempt += 1
                 continue
 
-            changed = git(["ls-files", "--modified",
-                          "--others", "--exclude-standard"])
-            write_debug("changed-files.txt", changed)
-            if not changed.strip():
+            if outcome == "no_changes":
                 self.feedback = f"Failure type: no_changes\n\nAttempt {attempt} did not produce real file changes."
                 write_debug("feedback.txt", self.feedback)
                 self.update_progress(
@@ -957,11 +2715,7 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
                 attempt += 1
                 continue
 
-            self.update_progress(
-                f"🧪 I applied changes and I am running checks.\n\nAttempt: {attempt}/{MAX_ATTEMPTS}\nStep: install/lint/test/build or detected project checks.")
-
-            checks_ok = self.run_project_checks()
-            if checks_ok:
+            if outcome == "ok":
                 self.final_summary = (
                     "I applied the fix successfully.\n\n"
                     f"Attempts used: {attempt}/{MAX_ATTEMPTS}\n\n"
@@ -1000,6 +2754,210 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
             f"❌ I could not get the checks to pass within the limits.\n\nAttempts used: {MAX_ATTEMPTS}/{MAX_ATTEMPTS}\nStatus: stopped without committing.")
         return False
 
+    def run_single_attempt(self, attempt: int, context: list[str], system: str) -> tuple[str, str]:
+        try:
+            response = self.call_with_retrieval(context, system)
+            write_debug("ai-response.txt", response)
+        except Exception as exc:
+            return "ai_endpoint", str(exc)
+        return self.evaluate_attempt(attempt, response), ""
+
+    def call_with_retrieval(
+        self,
+        context: list[str],
+        system: str,
+        root: Path = ROOT,
+        out: Path = OUT,
+        on_delta: Callable[[str], None] | None = None,
+        temperature: float = 0,
+    ) -> str:
+        history = list(self.conversation)
+        response = self.ai_call(context, system, MAX_TOKENS[self.mode], on_delta=on_delta,
+                                temperature=temperature, out=out, history=history)
+        retrieved: list[dict[str, Any]] = []
+        rows: list[str] = []
+        while len(rows) < MAX_RETRIEVAL_ROUNDS:
+            try:
+                data = parse_jsonish(response)
+            except Exception:
+                break
+            if not isinstance(data, dict) or not (data.get("needs_files") or data.get("needs_search")):
+                break
+            if self.apply_ai_response(response, root, out) != "needs_files":
+                break
+            specs = self.collect_requests(out)
+            if not specs:
+                break
+            chunk = self.render_requests(specs)
+            retrieved.extend(specs)
+            rows.append(f"- round {len(rows) + 1}: " + ", ".join(spec["key"] for spec in specs))
+            history += [
+                {"role": "user", "content": "".join(context)},
+                {"role": "assistant", "content": response},
+            ]
+            context = [chunk + "\n\nContinue with the same task. Reply with the same JSON format as before."]
+            response = self.ai_call(context, system, MAX_TOKENS[self.mode], on_delta=on_delta,
+                                    temperature=temperature, out=out, history=history)
+
+        write_debug("retrieved-requests.json", json.dumps(retrieved, indent=2), out)
+        write_debug("retrieval.md", "\n".join(
+            [f"Retrieval rounds: {len(rows)}/{MAX_RETRIEVAL_ROUNDS}", "", *rows]) + "\n", out)
+        return response
+
+    def evaluate_attempt(
+        self,
+        attempt: int,
+        response: str,
+        root: Path = ROOT,
+        out: Path = OUT,
+        cancel: threading.Event | None = None,
+        parallel: int = 1,
+    ) -> str:
+        status = self.apply_ai_response(response, root, out)
+        if status == "needs_files":
+            return "needs_files"
+        if status != "ok":
+            return "apply_error"
+
+        diff_check = run_cmd(["git", "diff", "--check"],
+                             capture=True, check=False, cwd=root)
+        write_debug("diff-check.txt", diff_check.stdout or "", out)
+        if diff_check.returncode != 0:
+            return "diff_check_failed"
+
+        changed = run_cmd(["git", "ls-files", "--modified", "--others", "--exclude-standard"],
+                          capture=True, check=False, cwd=root).stdout
+        write_debug("changed-files.txt", changed, out)
+        if not changed.strip():
+            return "no_changes"
+
+        primary = root == ROOT
+        if primary:
+            self.update_progress(
+                f"🧪 I applied changes and I am running checks.\n\nAttempt: {attempt}/{MAX_ATTEMPTS}\nStep: install/lint/test/build or detected project checks.")
+
+        checks_ok, reduced = self.run_project_checks(
+            root=root, out=out, cancel=cancel, parallel=parallel)
+        if checks_ok and reduced:
+            if primary:
+                self.update_progress(
+                    f"🧪 Checks for the affected packages and related tests passed.\n\nAttempt: {attempt}/{MAX_ATTEMPTS}\nStep: running the full check suite before committing.")
+            checks_ok, _ = self.run_project_checks(
+                final=True, root=root, out=out, cancel=cancel, parallel=parallel)
+        if cancel is not None and cancel.is_set():
+            return "cancelled"
+        return "ok" if checks_ok else "checks_failed"
+
+    def run_candidates(self, attempt: int, context: list[str], system: str) -> tuple[str, str]:
+        count = FIX_CANDIDATES
+        self.update_progress(
+            f"👀 I am trying {count} candidate fixes in parallel.\n\n"
+            f"Status: attempt {attempt}/{MAX_ATTEMPTS}\n"
+            "Step: the first candidate that passes every check wins.")
+
+        worktrees = RUNNER_TEMP / "ella-worktrees"
+        cancels = [threading.Event() for _ in range(count)]
+        results: list[tuple[str, str]] = [("cancelled", "")] * count
+
+        def run(index: int) -> None:
+            results[index] = self.run_candidate(
+                index, attempt, context, system,
+                worktrees / f"candidate-{index}", OUT / "candidates" / f"candidate-{index}",
+                cancels[index], count)
+            if results[index][0] == "ok":
+                for other, event in enumerate(cancels):
+                    if other != index:
+                        event.set()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=count) as pool:
+            list(pool.map(run, range(count)))
+
+        winner = min(range(count), key=lambda i: CANDIDATE_RANK.index(results[i][0]))
+        outcome, detail = results[winner]
+        winner_out = OUT / "candidates" / f"candidate-{winner}"
+        for path in winner_out.iterdir():
+            if path.is_file():
+                shutil.copy2(path, OUT / path.name)
+        if outcome in {"ok", "checks_failed", "diff_check_failed"}:
+            sync_working_tree(worktrees / f"candidate-{winner}", ROOT)
+            if BUILD_CACHE_ENABLED:
+                self.adopt_build_caches(worktrees / f"candidate-{winner}")
+
+        for index in range(count):
+            run_cmd(["git", "worktree", "remove", "--force", str(worktrees / f"candidate-{index}")],
+                    check=False, capture=True)
+        run_cmd(["git", "worktree", "prune"], check=False, capture=True)
+
+        lines = [f"Candidates for attempt {attempt}:", ""]
+        lines.extend(
+            f"- candidate-{i}{' (chosen)' if i == winner else ''}: {results[i][0]}"
+            for i in range(count))
+        write_debug("candidates.md", "\n".join(lines) + "\n")
+        return outcome, detail
+
+    def run_candidate(
+        self,
+        index: int,
+        attempt: int,
+        context: list[str],
+        system: str,
+        worktree: Path,
+        out: Path,
+        cancel: threading.Event,
+        parallel: int,
+    ) -> tuple[str, str]:
+        out.mkdir(parents=True, exist_ok=True)
+        for stale in out.iterdir():
+            if stale.is_file():
+                stale.unlink()
+        try:
+            self.create_candidate_worktree(worktree)
+        except Exception as exc:
+            write_debug("apply-error.txt", f"Failure type: worktree_failed\n{exc}\n", out)
+            return "apply_error", ""
+
+        def on_delta(_: str) -> None:
+            if cancel.is_set():
+                raise CommandError("Another candidate already passed.")
+
+        if index:
+            context = [*context[:-1], context[-1] + (
+                f"\n\nCandidate note: you are candidate {index + 1} of {parallel}. "
+                "Other candidates are working on the same task. Prefer a different valid approach.")]
+        try:
+            response = self.call_with_retrieval(
+                context, system, root=worktree, out=out, on_delta=on_delta,
+                temperature=min(1.0, 0.3 * index))
+            write_debug("ai-response.txt", response, out)
+        except Exception as exc:
+            return ("cancelled", "") if cancel.is_set() else ("ai_endpoint", str(exc))
+        if cancel.is_set():
+            return "cancelled", ""
+        return self.evaluate_attempt(attempt, response, worktree, out, cancel, parallel), ""
+
+    def create_candidate_worktree(self, worktree: Path) -> None:
+        with self.worktree_lock:
+            if worktree.exists():
+                run_cmd(["git", "worktree", "remove", "--force", str(worktree)],
+                        check=False, capture=True)
+                shutil.rmtree(worktree, ignore_errors=True)
+            worktree.parent.mkdir(parents=True, exist_ok=True)
+            run_cmd(["git", "worktree", "add", "--detach", str(worktree), "HEAD"], capture=True)
+            ignored = git(["ls-files", "--others", "--ignored",
+                          "--exclude-standard", "--directory"], check=False).splitlines()
+
+        sync_working_tree(ROOT, worktree)
+        for rel in ignored:
+            rel = rel.strip().rstrip("/")
+            if not rel or not (ROOT / rel).is_dir():
+                continue
+            if Path(rel).name == "node_modules":
+                copy_tree_fast(ROOT / rel, worktree / rel)
+                continue
+            (worktree / rel).parent.mkdir(parents=True, exist_ok=True)
+            subprocess.run(["cp", "-a", "--reflink=auto", str(ROOT / rel), str(worktree / rel)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
     def system_prompt_for_fix(self) -> str:
         if self.mode == "solve":
             action = "You are solving a GitHub issue by editing a branch and opening a PR."
@@ -1010,13 +2968,13 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
             "Write in English. Use first person when referring to yourself. Do not refer to yourself in the third person. "
             f"{action} "
             "Return only valid JSON. No Markdown. No code fences. "
-            "You may ask for file contents using needs_files. "
-            "When editing, return a files array with complete final file contents."
+            "You may ask for file contents using needs_files or search the repository using needs_search. "
+            "When editing, return a files array. Each item carries complete content, a unified diff patch, or search/replace edits."
         )
 
-    def build_fix_context(self, attempt: int) -> str:
-        lines: list[str] = [
-            f"You are running attempt {attempt} of {MAX_ATTEMPTS}.",
+    def build_fix_context(self, attempt: int) -> list[str]:
+        stable: list[str] = [
+            f"Attempt limit: {MAX_ATTEMPTS}.",
             f"Time limit: {TIME_LIMIT_SECONDS} seconds.",
             "",
             "User request:",
@@ -1030,60 +2988,61 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
             "Schema for editing files:",
             '{ "summary": "short explanation", "files": [ { "path": "relative/path.ext", "content": "complete final file content" } ] }',
             "",
+            "Each files item may use one of these instead of content:",
+            '{ "path": "relative/path.ext", "patch": "@@ -12,3 +12,4 @@\\n context\\n-old line\\n+new line\\n context" }',
+            '{ "path": "relative/path.ext", "edits": [ { "search": "exact current lines", "replace": "new lines" } ] }',
+            "",
             "Optional schema if you need to inspect files before editing:",
-            '{ "summary": "need more file contents", "needs_files": ["relative/path.ext"] }',
+            '{ "summary": "need more file contents", "needs_files": ["relative/path.ext", "relative/large-file.ext:120-200"] }',
+            "",
+            "Optional schema to find code, such as call sites or definitions, without reading whole files:",
+            '{ "summary": "need to find code", "needs_search": [ { "query": "getUser(", "regex": false, "path": "optional/dir/prefix/" } ] }',
             "",
             "Rules:",
             "- Write in English.",
             "- Use first person when referring to yourself.",
             "- Do not refer to yourself in the third person.",
-            "- Return complete final file content for every edited file.",
+            "- Prefer patch or edits for small changes in large files. Use content for new files or full rewrites.",
+            "- Every search block must match exactly one place in the current file.",
+            "- Large files are shown as FILE WINDOWS with a line number and | before each line. That prefix is not file content. Ask for path:start-end in needs_files to see more lines.",
             "- Keep the smallest safe change possible.",
             "- Do not include explanations outside JSON.",
             "- Do not edit secrets, env files, lockfiles, generated files, or ignored files.",
             "- If previous feedback exists, fix that feedback only.",
-            "",
-            "Previous failure type and feedback:",
-            self.feedback,
-            "",
-            "Extra file context requested in previous attempts:",
-            self.extra_context,
+            "- File contents below show the current state of the working tree, including your earlier edits.",
             "",
             "Allowed files:",
             "\n".join(self.allowed_files),
         ]
+        extra = self.ledger_context()
+        working: list[str] = [
+            "Extra file context requested in previous attempts:",
+            extra,
+        ]
+        fixed = [("request, rules and allowed files", estimate_tokens("\n".join(stable)))]
+        file_paths: list[str] = []
 
         if self.mode in {"fix", "continue"}:
-            lines.extend([
-                "",
-                "PR info:",
-                json.dumps(self.pr_info or {}, indent=2),
-                "",
-                "PR diff, truncated:",
-                (OUT / "pr-diff-limited.txt").read_text(encoding="utf-8",
-                                                        errors="replace") if (OUT / "pr-diff-limited.txt").exists() else "",
-                "",
-                "Allowed files current content, truncated:",
-            ])
-            for rel in self.allowed_files:
-                path = ROOT / rel
-                if path.exists():
-                    lines.append(
-                        f"\n----- FILE: {rel} -----\n{read_text_limited(path, MAX_CONTEXT_FILE_BYTES)}\n----- END FILE: {rel} -----")
+            diff = (OUT / "pr-diff-limited.txt").read_text(encoding="utf-8",
+                                                           errors="replace") if (OUT / "pr-diff-limited.txt").exists() else ""
+            info = json.dumps(self.pr_info or {}, indent=2)
+            stable.extend(["", "PR info:", info, "", "PR diff, truncated:", diff])
+            fixed.extend([("PR info", estimate_tokens(info)), ("PR diff", estimate_tokens(diff))])
+            working.extend(["", "Allowed files current content, truncated:"])
+            file_paths = [rel for rel in self.allowed_files if (ROOT / rel).exists()]
 
         if self.mode == "solve":
-            lines.extend([
-                "",
-                "Issue info:",
-                json.dumps(self.issue_info or {}, indent=2),
-                "",
-                "Repository files, truncated:",
-                (OUT / "repo-files-limited.txt").read_text(encoding="utf-8",
-                                                           errors="replace") if (OUT / "repo-files-limited.txt").exists() else "",
-                "",
-                "Common project files:",
-            ])
-            for rel in [
+            listing = (OUT / "repo-files-limited.txt").read_text(encoding="utf-8",
+                                                                 errors="replace") if (OUT / "repo-files-limited.txt").exists() else ""
+            info = json.dumps(self.issue_info or {}, indent=2)
+            stable.extend(["", "Issue info:", info, "", "Repository files, truncated:", listing])
+            fixed.extend([("issue info", estimate_tokens(info)), ("repository file list", estimate_tokens(listing))])
+            if self.symbol_summary:
+                stable.extend(["", "Exported symbols and routes in the files that best match the issue:",
+                               self.symbol_summary])
+                fixed.append(("symbol index", estimate_tokens(self.symbol_summary)))
+            working.extend(["", "Files preselected from the issue text and common project files:"])
+            file_paths = self.preselected_files + [rel for rel in [
                 "package.json",
                 "turbo.json",
                 "pnpm-workspace.yaml",
@@ -1096,136 +3055,519 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
                 "compose.yml",
                 "README.md",
                 "tsconfig.json",
-            ]:
-                path = ROOT / rel
-                if path.exists() and not is_ignored(rel, self.ignore_patterns):
-                    lines.append(
-                        f"\n----- FILE: {rel} -----\n{read_text_limited(path, MAX_CONTEXT_FILE_BYTES)}\n----- END FILE: {rel} -----")
+            ] if (ROOT / rel).exists() and not is_ignored(rel, self.ignore_patterns)
+                and rel not in self.preselected_files]
+
+        volatile = [
+            f"You are running attempt {attempt} of {MAX_ATTEMPTS}.",
+            "",
+            "Previous failure type and feedback:",
+            self.feedback,
+        ]
+        fixed.extend([
+            ("extra requested files", estimate_tokens(extra)),
+            ("attempt and feedback", estimate_tokens("\n".join(volatile))),
+        ])
+        file_paths = [rel for rel in file_paths if f"file:{rel}" not in self.context_ledger]
+        packed, file_rows = self.pack_context_files(
+            file_paths, CONTEXT_TOKEN_BUDGET - sum(tokens for _, tokens in fixed))
+        working.extend(packed)
+        self.write_context_budget(fixed, file_rows)
+
+        segments = ["\n".join(stable) + "\n\n", "\n".join(working) + "\n\n", "\n".join(volatile)]
+        write_debug("context.txt", "".join(segments))
+        self.record_prompt_cache(attempt, self.system_prompt_for_fix(), segments)
+        return segments
+
+    def pack_context_files(self, paths: list[str], budget: int) -> tuple[list[str], list[tuple[str, int, str]]]:
+        ranges = self.pr_hunk_ranges()
+        hunks = {rel: len(found) for rel, found in ranges.items()}
+        blocks = {rel: self.file_block(rel, ranges.get(rel)) for rel in paths}
+        failing = {rel for rel in paths if mentioned_in(rel, self.feedback)}
+        imported: set[str] = set()
+        for rel in paths:
+            if rel in failing or hunks.get(rel) or rel in self.preselected_files:
+                imported |= import_stems(blocks[rel])
+
+        def rank(rel: str) -> tuple[int, str]:
+            if rel in failing:
+                return 3, "named in check output"
+            if hunks.get(rel):
+                return 2, f"{hunks[rel]} diff hunks"
+            if rel in self.preselected_files:
+                return 2, "matches the issue text"
+            if module_stem(rel) in imported:
+                return 1, "import neighbour"
+            return 0, "other"
+
+        ranked = sorted(paths, key=lambda rel: (-rank(rel)[0], -hunks.get(rel, 0), len(blocks[rel])))
+        included: set[str] = set()
+        rows: list[tuple[str, int, str]] = []
+        remaining = budget
+        for rel in ranked:
+            cost = estimate_tokens(blocks[rel])
+            if cost <= remaining:
+                included.add(rel)
+                remaining -= cost
+            rows.append((f"file {rel} ({rank(rel)[1]})", cost,
+                         "included" if rel in included else "omitted"))
+
+        packed = [blocks[rel] for rel in paths if rel in included]
+        omitted = [rel for rel in ranked if rel not in included]
+        if omitted:
+            packed.append(
+                "\nFiles left out to stay within the context budget. Request them with needs_files if you need them:\n"
+                + "\n".join(omitted))
+        return packed, rows
+
+    def pr_hunk_ranges(self) -> dict[str, list[tuple[int, int]]]:
+        diff_path = OUT / "pr-diff-limited.txt"
+        if not diff_path.exists():
+            return {}
+        return diff_hunk_ranges(diff_path.read_text(encoding="utf-8", errors="replace"))
+
+    def file_block(self, rel: str, hunks: list[tuple[int, int]] | None = None) -> str:
+        path = ROOT / rel
+        text = self.read_cached(path, MAX_CONTEXT_FILE_BYTES)
+        if not path.is_file() or (path.stat().st_size <= MAX_CONTEXT_FILE_BYTES
+                                  and text.count("\n") < FILE_WINDOW_LINES):
+            return f"\n----- FILE: {rel} -----\n{text}\n----- END FILE: {rel} -----"
+
+        full = self.read_cached(path, 4_000_000)
+        focus = [*(hunks or []), *((n, n) for n in failing_line_numbers(rel, self.feedback))]
+        view = render_line_windows(full, focus or [(1, FILE_WINDOW_LINES)], FILE_WINDOW_RADIUS)
+        return (
+            f"\n----- FILE WINDOWS: {rel} ({len(full.splitlines())} lines) -----\n{view}\n"
+            f"----- END FILE WINDOWS: {rel} -----")
 
+    def write_context_budget(self, fixed: list[tuple[str, int]], files: list[tuple[str, int, str]]) -> None:
+        used = sum(tokens for _, tokens in fixed) + sum(
+            tokens for _, tokens, status in files if status == "included")
+        lines = [
+            f"Context budget: {used}/{CONTEXT_TOKEN_BUDGET} estimated tokens (characters / 4).",
+            "",
+            "| section | tokens | status |",
+            "| --- | --- | --- |",
+            *[f"| {name} | {tokens} | fixed |" for name, tokens in fixed],
+            *[f"| {name} | {tokens} | {status} |" for name, tokens, status in files],
+        ]
+        write_debug("context-budget.md", "\n".join(lines) + "\n")
+
+    def build_conversation_turn(self, attempt: int) -> list[str]:
+        kind = "full"
+        if self.conversation:
+            followup = self.build_followup_context(attempt)
+            history = sum(len(message["content"]) for message in self.conversation)
+            if (history + len(followup)) // 4 <= CONVERSATION_TOKEN_BUDGET:
+                context, kind = [followup], "follow-up"
+            else:
+                self.conversation = []
+                kind = "compacted"
+
+        if kind != "follow-up":
+            context = self.build_fix_context(attempt)
+            self.pending_file_hashes = self.conversation_file_hashes(
+                self.tracked_conversation_files())
+            self.pending_ledger_hashes = self.ledger_hashes(self.ledger_blocks())
+
+        sent = sum(len(segment) for segment in context)
+        history = sum(len(message["content"]) for message in self.conversation)
+        self.conversation_rows.append(
+            f"| {attempt} | {kind} | {sent} | {(history + sent) // 4} |")
+        lines = [
+            "Conversation turns (characters sent, estimated tokens in the request):",
+            "",
+            f"Token budget before compaction: {CONVERSATION_TOKEN_BUDGET}",
+            "",
+            "| attempt | turn | sent | request tokens |",
+            "| --- | --- | --- | --- |",
+            *self.conversation_rows,
+        ]
+        write_debug("conversation.md", "\n".join(lines) + "\n")
+        return context
+
+    def build_followup_context(self, attempt: int) -> str:
+        tracked = self.tracked_conversation_files()
+        current = self.conversation_file_hashes(tracked)
+        self.pending_file_hashes = current
+        blocks = self.ledger_blocks()
+        self.pending_ledger_hashes = self.ledger_hashes(blocks)
+
+        lines = [
+            f"You are running attempt {attempt} of {MAX_ATTEMPTS}.",
+            "",
+            "I processed your previous response. Failure type and feedback:",
+            self.feedback,
+        ]
+
+        changed = [rel for rel in tracked if current.get(rel) != self.conversation_file_hashes_sent.get(rel)]
+        new_extra = [
+            block for key, block in blocks.items()
+            if self.pending_ledger_hashes[key] != self.conversation_ledger_sent.get(key)
+            and not (self.context_ledger[key]["kind"] == "file" and self.context_ledger[key]["rel"] in changed)
+        ]
+        if new_extra:
+            lines.extend(["", "Extra file context you requested:", *new_extra])
+
+        ranges = self.pr_hunk_ranges()
+        if changed:
+            lines.extend(["", "Files that changed since you last saw them, truncated:"])
+            for rel in changed:
+                if rel not in current:
+                    lines.append(f"\n----- FILE DELETED: {rel} -----")
+                    continue
+                lines.append(self.file_block(rel, ranges.get(rel)))
+
+        lines.extend([
+            "",
+            "Earlier file contents in this conversation are out of date where a newer copy appears above.",
+            "Reply with the same JSON format as before.",
+        ])
         context = "\n".join(lines)
         write_debug("context.txt", context)
         return context
 
-    def apply_ai_response(self, response: str) -> str:
+    def tracked_conversation_files(self) -> list[str]:
+        tracked = set(self.conversation_file_hashes_sent) | set(self.changed_files_for_scope())
+        if self.mode in {"fix", "continue"}:
+            tracked.update(self.allowed_files)
+        return sorted(rel for rel in tracked
+                      if safe_rel_path(rel) and not is_ignored(rel, self.ignore_patterns))
+
+    @staticmethod
+    def conversation_file_hashes(paths: list[str]) -> dict[str, str]:
+        hashes: dict[str, str] = {}
+        for rel in paths:
+            path = ROOT / rel
+            if path.is_file():
+                hashes[rel] = hashlib.sha256(
+                    read_text_limited(path, MAX_CONTEXT_FILE_BYTES).encode("utf-8")).hexdigest()
+        return hashes
+
+    @staticmethod
+    def ledger_hashes(blocks: dict[str, str]) -> dict[str, str]:
+        return {key: hashlib.sha256(block.encode("utf-8")).hexdigest() for key, block in blocks.items()}
+
+    def remember_turn(self, context: list[str], response: str) -> None:
+        self.conversation.extend([
+            {"role": "user", "content": "".join(context)},
+            {"role": "assistant", "content": response},
+        ])
+        self.conversation_file_hashes_sent = self.pending_file_hashes
+        self.conversation_ledger_sent = self.pending_ledger_hashes
+
+    def record_prompt_cache(self, attempt: int, system_prompt: str, segments: list[str]) -> None:
+        prompt = system_prompt + "".join(segments)
+        previous = self.last_fix_prompt
+        shared = len(os.path.commonprefix([previous, prompt])) if previous else 0
+        self.last_fix_prompt = prompt
+        self.prompt_cache_rows.append(
+            f"| {attempt} | {len(prompt)} | {len(system_prompt) + len(segments[0])} | {shared} | {shared * 100 // max(1, len(prompt))}% |")
+
+        lines = [
+            "Prompt prefix reuse per attempt (characters):",
+            "",
+            f"Cache-control hints: {'on' if AI_CACHE_CONTROL else 'off'}",
+            "",
+            "| attempt | prompt | stable prefix | shared with previous | reusable |",
+            "| --- | --- | --- | --- | --- |",
+            *self.prompt_cache_rows,
+            "",
+            "Provider-reported cached tokens, when the endpoint sends usage, are in ai-timings.json.",
+        ]
+        write_debug("prompt-cache.md", "\n".join(lines) + "\n")
+
+    def apply_ai_response(self, response: str, root: Path = ROOT, out: Path = OUT) -> str:
         try:
             data = parse_jsonish(response)
         except Exception as exc:
             write_debug(
-                "apply-error.txt", f"Failure type: invalid_json\nAI response JSON parse failed: {exc}\n\nAI response preview:\n{response[:4000]}")
+                "apply-error.txt", f"Failure type: invalid_json\nAI response JSON parse failed: {exc}\n\nAI response preview:\n{response[:4000]}", out)
             return "error"
 
         if not isinstance(data, dict):
             write_debug(
-                "apply-error.txt", f"Failure type: invalid_json\nAI response JSON must be an object.\n\nAI response preview:\n{response[:4000]}")
+                "apply-error.txt", f"Failure type: invalid_json\nAI response JSON must be an object.\n\nAI response preview:\n{response[:4000]}", out)
             return "error"
 
         summary = str(data.get("summary")
                       or "I applied the requested fix.").strip()
-        write_debug("fix-summary.txt", summary + "\n")
+        write_debug("fix-summary.txt", summary + "\n", out)
 
         needs_files = data.get("needs_files")
-        if isinstance(needs_files, list) and needs_files:
+        searches = parse_search_requests(data.get("needs_search"))
+        if (isinstance(needs_files, list) and needs_files) or searches:
             requested: list[str] = []
             allowed_set = set(self.allowed_files)
 
-            for item in needs_files:
+            for item in needs_files if isinstance(needs_files, list) else []:
                 if not isinstance(item, str):
                     continue
-                path = item.strip()
+                path, _ = split_line_range(item.strip())
                 if not safe_rel_path(path) or is_ignored(path, self.ignore_patterns):
                     continue
                 if self.mode == "solve":
-                    if (ROOT / path).exists():
-                        requested.append(path)
+                    if (root / path).exists():
+                        requested.append(item.strip())
                 elif path in allowed_set:
-                    requested.append(path)
+                    requested.append(item.strip())
 
-            write_debug("needed-files.txt", "\n".join(requested) + "\n")
+            write_debug("needed-files.txt", "\n".join(requested) + "\n", out)
+            write_debug("needed-searches.json", json.dumps(searches, indent=2), out)
             return "needs_files"
 
         files = data.get("files")
         if not isinstance(files, list):
             write_debug(
-                "apply-error.txt", f"Failure type: invalid_json\nAI response JSON must contain either needs_files or files array.\n\nAI response preview:\n{response[:4000]}")
+                "apply-error.txt", f"Failure type: invalid_json\nAI response JSON must contain either needs_files or files array.\n\nAI response preview:\n{response[:4000]}", out)
             return "error"
 
         allowed_set = set(self.allowed_files)
-        changed_count = 0
+        planned: dict[str, str] = {}
+        failures: list[tuple[str, str, str]] = []
 
         for item in files:
             if not isinstance(item, dict):
                 write_debug(
-                    "apply-error.txt", "Failure type: invalid_json\nEach files item must be an object.")
+                    "apply-error.txt", "Failure type: invalid_json\nEach files item must be an object.", out)
                 return "error"
 
             path = item.get("path")
             content = item.get("content")
+            patch = item.get("patch")
+            edits = item.get("edits")
 
             if not isinstance(path, str) or not path.strip():
                 write_debug(
-                    "apply-error.txt", "Failure type: invalid_json\nEach files item must contain a path string.")
+                    "apply-error.txt", "Failure type: invalid_json\nEach files item must contain a path string.", out)
                 return "error"
 
-            if not isinstance(content, str):
+            if not isinstance(content, str) and not isinstance(patch, str) and not isinstance(edits, list):
                 write_debug(
-                    "apply-error.txt", f"Failure type: invalid_json\nFile {path} must contain a content string.")
+                    "apply-error.txt", f"Failure type: invalid_json\nFile {path} must contain a content string, a patch string, or an edits array.", out)
                 return "error"
 
             path = path.strip()
 
             if not safe_rel_path(path):
-                write_debug(
-                    "apply-error.txt", f"Failure type: unsafe_file\nUnsafe file path rejected: {path}")
-                return "error"
+                failures.append(
+                    (path, "unsafe_file", "Unsafe file path rejected."))
+                continue
 
             if is_ignored(path, self.ignore_patterns):
-                write_debug(
-                    "apply-error.txt", f"Failure type: ignored_file\nRefusing to edit ignored file: {path}")
-                return "error"
+                failures.append(
+                    (path, "ignored_file", "Refusing to edit ignored file."))
+                continue
 
             if self.mode in {"fix", "continue"} and path not in allowed_set:
-                write_debug(
-                    "apply-error.txt", f"Failure type: file_not_allowed\nFile path is not in allowed files list: {path}")
-                return "error"
+                failures.append(
+                    (path, "file_not_allowed", "File path is not in allowed files list."))
+                continue
 
-            if self.mode == "solve" and path not in allowed_set and (ROOT / path).exists():
-                if is_ignored(path, self.ignore_patterns):
-                    write_debug(
-                        "apply-error.txt", f"Failure type: ignored_file\nRefusing to edit ignored file: {path}")
-                    return "error"
+            target = root / path
+            if path in planned:
+                current = planned[path]
+            elif target.exists():
+                current = target.read_text(encoding="utf-8", errors="replace")
+            else:
+                current = None
 
-            target = ROOT / path
-            target.parent.mkdir(parents=True, exist_ok=True)
-            target.write_text(content, encoding="utf-8")
-            changed_count += 1
+            try:
+                if isinstance(content, str):
+                    planned[path] = content
+                elif isinstance(patch, str):
+                    planned[path] = apply_unified_patch(current or "", patch)
+                else:
+                    if current is None:
+                        raise PatchError(
+                            "File does not exist. Use content to create it.")
+                    planned[path] = apply_search_replace(current, edits)
+            except PatchError as exc:
+                failures.append((path, "patch_failed", str(exc)))
+
+        if failures:
+            lines = [f"Failure type: {failures[0][1]}",
+                     "I did not write any file because these edits could not be applied:"]
+            lines.extend(f"- {path} ({kind}): {reason}" for path,
+                         kind, reason in failures)
+            lines.append(
+                "Resend these files with corrected edits, a patch that matches the current content, or complete content.")
+            write_debug("apply-error.txt", "\n".join(lines) + "\n", out)
+            return "error"
 
-        if changed_count == 0:
+        if not planned:
             write_debug(
-                "apply-error.txt", "Failure type: no_changes\nAI returned zero files to change.")
+                "apply-error.txt", "Failure type: no_changes\nAI returned zero files to change.", out)
             return "error"
 
+        changed = {}
+        for path, text in planned.items():
+            target = root / path
+            if target.is_file() and target.read_bytes() == text.encode("utf-8"):
+                continue
+            changed[target] = text
+        write_files_atomically(changed)
         return "ok"
 
     def append_needed_files_context(self) -> None:
-        needed = (OUT / "needed-files.txt")
-        if not needed.exists() or not needed.read_text(encoding="utf-8").strip():
+        specs = self.collect_requests(OUT)
+        if not specs:
             self.feedback = "Failure type: invalid_needs_files\nThe model requested file contents, but no valid allowed files were requested."
             return
-
-        chunks = ["\nFiles requested by the model:"]
-        for rel in needed.read_text(encoding="utf-8", errors="replace").splitlines():
-            rel = rel.strip()
-            if not rel:
+        self.add_to_ledger(specs)
+
+    def collect_requests(self, out: Path) -> list[dict[str, Any]]:
+        specs: list[dict[str, Any]] = []
+        needed = out / "needed-files.txt"
+        if needed.exists():
+            for item in needed.read_text(encoding="utf-8", errors="replace").splitlines():
+                rel, line_range = split_line_range(item.strip())
+                if not rel:
+                    continue
+                if line_range:
+                    specs.append({"key": f"lines:{rel}:{line_range[0]}-{line_range[1]}",
+                                  "kind": "lines", "rel": rel, "range": list(line_range)})
+                else:
+                    specs.append({"key": f"file:{rel}", "kind": "file", "rel": rel})
+        try:
+            searches = json.loads((out / "needed-searches.json").read_text(encoding="utf-8"))
+        except Exception:
+            searches = []
+        for search in searches:
+            specs.append({"key": "search:" + json.dumps(search, sort_keys=True),
+                          "kind": "search", "search": search})
+        return specs
+
+    def add_to_ledger(self, specs: list[dict[str, Any]]) -> None:
+        for spec in specs:
+            if spec["kind"] == "file":
+                for key in [key for key, old in self.context_ledger.items()
+                            if old["kind"] == "lines" and old["rel"] == spec["rel"]]:
+                    del self.context_ledger[key]
+            elif spec["kind"] == "lines" and f"file:{spec['rel']}" in self.context_ledger:
+                continue
+            self.context_ledger.setdefault(spec["key"], spec)
+        write_debug("extra-context.txt", self.ledger_context())
+
+    def prune_ledger(self) -> None:
+        for key, spec in list(self.context_ledger.items()):
+            if spec["kind"] != "search" and not self.requestable(spec["rel"]):
+                del self.context_ledger[key]
+
+    def requestable(self, rel: str) -> bool:
+        return safe_rel_path(rel) and (ROOT / rel).exists() and not is_ignored(rel, self.ignore_patterns)
+
+    def ledger_blocks(self) -> dict[str, str]:
+        specs = list(self.context_ledger.values())
+        return dict(zip((spec["key"] for spec in specs), self.render_request_blocks(specs)))
+
+    def ledger_context(self) -> str:
+        return self.render_requests(list(self.context_ledger.values()))
+
+    def render_requests(self, specs: list[dict[str, Any]]) -> str:
+        if not specs:
+            return ""
+        return "\n".join(["\nContext requested by the model:", *self.render_request_blocks(specs)])
+
+    def render_request_blocks(self, specs: list[dict[str, Any]]) -> list[str]:
+        modified: set[str] | None = None
+        blocks: list[str] = []
+        for spec in specs:
+            if spec["kind"] == "search":
+                if modified is None:
+                    modified = {rel for rel in self.changed_files_for_scope()
+                                if safe_rel_path(rel) and not is_ignored(rel, self.ignore_patterns)}
+                blocks.append(self.run_search(self.get_search_index(), modified, spec["search"]))
                 continue
+
+            rel = spec["rel"]
             path = ROOT / rel
-            if path.exists() and safe_rel_path(rel) and not is_ignored(rel, self.ignore_patterns):
-                chunks.append(
-                    f"\n----- REQUESTED FILE: {rel} -----\n{read_text_limited(path, MAX_CONTEXT_REQUESTED_FILE_BYTES)}\n----- END REQUESTED FILE: {rel} -----")
+            if not self.requestable(rel):
+                blocks.append(f"\n----- REQUESTED FILE MISSING OR BLOCKED: {rel} -----")
+            elif spec["kind"] == "lines":
+                item = f"{rel}:{spec['range'][0]}-{spec['range'][1]}"
+                view = render_line_windows(self.read_cached(path, 4_000_000), [tuple(spec["range"])], 0, expand=False)
+                blocks.append(
+                    f"\n----- REQUESTED LINES: {item} -----\n{view}\n----- END REQUESTED LINES: {item} -----")
             else:
-                chunks.append(
-                    f"\n----- REQUESTED FILE MISSING OR BLOCKED: {rel} -----")
-        self.extra_context += "\n".join(chunks)
-        write_debug("extra-context.txt", self.extra_context)
+                blocks.append(
+                    f"\n----- REQUESTED FILE: {rel} -----\n{self.read_cached(path, MAX_CONTEXT_REQUESTED_FILE_BYTES)}\n----- END REQUESTED FILE: {rel} -----")
+        return blocks
+
+    def get_search_index(self) -> TrigramIndex:
+        tree = git(["rev-parse", "HEAD^{tree}"], check=False).strip()
+        with self.search_lock:
+            if self.search_index is not None and self.search_index[0] == tree:
+                return self.search_index[1]
+
+            started = time.monotonic()
+            files: dict[str, str] = {}
+            for rel in git(["ls-files"]).splitlines():
+                if not rel or not safe_rel_path(rel) or is_ignored(rel, self.ignore_patterns):
+                    continue
+                try:
+                    with (ROOT / rel).open("rb") as f:
+                        data = f.read(SEARCH_MAX_FILE_BYTES + 1)
+                except OSError:
+                    continue
+                if len(data) > SEARCH_MAX_FILE_BYTES or b"\0" in data[:8192]:
+                    continue
+                files[rel] = data.decode("utf-8", errors="replace")
+
+            index = TrigramIndex(files)
+            self.search_index = (tree, index)
+            write_debug(
+                "search-index.md",
+                f"Search index for tree {tree}: {len(files)} files, {len(index.postings)} trigrams, "
+                f"built in {int((time.monotonic() - started) * 1000)}ms.\n")
+            return index
+
+    def run_search(self, index: TrigramIndex, modified: set[str], search: dict[str, Any]) -> str:
+        query, regex, prefix = search["query"], search["regex"], search["path"]
+        label = f"{'regex' if regex else 'literal'} {json.dumps(query)}" + (f" in {prefix}" if prefix else "")
+        try:
+            pattern = re.compile(query if regex else re.escape(query))
+        except re.error as exc:
+            return f"\n----- SEARCH: {label} -----\nInvalid regex: {exc}\n----- END SEARCH -----"
+
+        found = index.candidates(query, regex)
+        paths = sorted((set(index.files) if found is None else found) | modified)
+        hits: list[str] = []
+        total = 0
+        size = 0
+        for rel in paths:
+            if prefix and not rel.startswith(prefix):
+                continue
+            text = self.read_cached(ROOT / rel, SEARCH_MAX_FILE_BYTES) if rel in modified else index.files.get(rel, "")
+            for number, line in enumerate(text.splitlines(), 1):
+                if not pattern.search(line):
+                    continue
+                total += 1
+                if len(hits) < SEARCH_MAX_RESULTS and size < SEARCH_MAX_RESULT_BYTES:
+                    hit = f"{rel}:{number}: {line.strip()[:200]}"
+                    hits.append(hit)
+                    size += len(hit)
+
+        lines = [f"\n----- SEARCH: {label} ({total} matches) -----", *hits]
+        if total > len(hits):
+            lines.append(f"[{total - len(hits)} more matches not shown. Narrow the query or add a path prefix.]")
+        lines.append("----- END SEARCH -----")
+        return "\n".join(lines)
+
+    def read_cached(self, path: Path, limit: int) -> str:
+        try:
+            stat = path.stat()
+        except OSError:
+            return ""
+        key = (str(path), limit)
+        with self.file_cache_lock:
+            cached = self.file_cache.get(key)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        text = read_text_limited(path, limit)
+        with self.file_cache_lock:
+            self.file_cache[key] = (stat.st_mtime_ns, stat.st_size, text)
+        return text
 
     def prepare_environment(self) -> bool:
         if (ROOT / ".ella" / "checks.sh").exists():
@@ -1237,9 +3579,22 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
         ok = True
 
         for name, cmd in self.detect_install_commands():
+            key = self.install_cache_key(name)
+            cache_note = ""
+            if key and self.restore_install_cache(key):
+                cache_note = ", cache hit"
+                if name == "npm":
+                    summaries.append(f"- ✅ install ({name}{cache_note})")
+                    continue
+            elif key:
+                cache_note = ", cache miss"
+
             success, log = self.run_logged_check(
                 f"install-{name}", cmd, timeout=1200)
-            summaries.append(f"- {'✅' if success else '❌'} install ({name})")
+            if success and cache_note == ", cache miss":
+                self.save_install_cache(key, name)
+            summaries.append(
+                f"- {'✅' if success else '❌'} install ({name}{cache_note})")
             if not success:
                 summaries.append("")
                 summaries.append(f"Last lines from install ({name}):")
@@ -1254,6 +3609,179 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
         write_debug("install-summary.md", "\n".join(summaries) + "\n")
         return ok
 
+    def install_cache_targets(self, manager: str) -> list[str]:
+        if manager in {"pnpm", "npm", "yarn", "bun"}:
+            if self.workspace_packages is None:
+                self.workspace_packages = load_workspace_packages(ROOT)
+            dirs = ["", *sorted(info["dir"] for info in self.workspace_packages.values())]
+            return [f"{d}/node_modules" if d else "node_modules" for d in dirs]
+        if manager in {"uv", "poetry"}:
+            return [".venv"]
+        if manager == "composer":
+            return ["vendor"]
+        return []
+
+    def install_cache_key(self, manager: str) -> str | None:
+        if not INSTALL_CACHE_ENABLED or manager not in INSTALL_CACHE_LOCKFILES:
+            return None
+        lockfiles = [ROOT / x for x in INSTALL_CACHE_LOCKFILES[manager] if (ROOT / x).exists()]
+        if not lockfiles:
+            return None
+
+        if manager in {"pnpm", "npm", "yarn", "bun"}:
+            toolchain = run_cmd(["node", "--version"], check=False, timeout=30).stdout.strip() if command_exists("node") else ""
+        elif manager == "composer":
+            toolchain = run_cmd(["php", "--version"], check=False, timeout=30).stdout.strip() if command_exists("php") else ""
+        else:
+            toolchain = sys.version
+
+        digest = hashlib.sha256()
+        for part in [manager, toolchain, str(ROOT), *self.install_cache_targets(manager)]:
+            digest.update(part.encode("utf-8") + b"\0")
+        for lockfile in lockfiles:
+            digest.update(lockfile.read_bytes())
+        return f"{manager}-{digest.hexdigest()[:32]}"
+
+    def restore_install_cache(self, key: str) -> bool:
+        entry = CACHE_DIR / "install" / key
+        meta_path = entry / "meta.json"
+        if not meta_path.exists():
+            return False
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            for rel in meta.get("targets", []):
+                copy_tree_fast(entry / "files" / rel, ROOT / rel)
+            meta["last_used"] = time.time()
+            meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            return True
+        except Exception as exc:
+            write_debug("install-cache-error.txt", f"Restore failed for {key}: {exc}\n")
+            return False
+
+    def save_install_cache(self, key: str, manager: str) -> None:
+        store = CACHE_DIR / "install"
+        entry = store / key
+        tmp = store / f".{key}.{os.getpid()}.tmp"
+        try:
+            shutil.rmtree(tmp, ignore_errors=True)
+            targets = [rel for rel in self.install_cache_targets(manager) if (ROOT / rel).is_dir()]
+            if not targets:
+                return
+            for rel in targets:
+                copy_tree_fast(ROOT / rel, tmp / "files" / rel)
+            meta = {
+                "key": key,
+                "manager": manager,
+                "targets": targets,
+                "size_bytes": dir_size_bytes(tmp / "files"),
+                "created": time.time(),
+                "last_used": time.time(),
+            }
+            (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+            evicted = evict_lru_entries(store, INSTALL_CACHE_MAX_MB * 1024 * 1024)
+            if evicted:
+                write_debug("install-cache-evicted.txt", "\n".join(evicted) + "\n")
+        except Exception as exc:
+            shutil.rmtree(tmp, ignore_errors=True)
+            write_debug("install-cache-error.txt", f"Save failed for {key}: {exc}\n")
+
+    def build_cache_key(self) -> str:
+        branch = git(["rev-parse", "--abbrev-ref", "HEAD"], check=False).strip() or "HEAD"
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "-", f"{self.repo}__{branch}").strip("-")
+        digest = hashlib.sha256(f"{self.repo}\0{branch}".encode("utf-8")).hexdigest()[:12]
+        return f"{slug[:80]}-{digest}"
+
+    def build_cache_targets(self, root: Path = ROOT) -> list[str]:
+        if self.workspace_packages is None:
+            self.workspace_packages = load_workspace_packages(ROOT)
+        dirs = ["", *sorted(info["dir"] for info in self.workspace_packages.values())]
+        targets: list[str] = []
+        for d in dirs:
+            base = root / d if d else root
+            for pattern in BUILD_CACHE_PATTERNS:
+                for path in sorted(base.glob(pattern)):
+                    rel = path.relative_to(root).as_posix()
+                    if rel not in targets and not path.is_symlink():
+                        targets.append(rel)
+        return targets
+
+    def adopt_build_caches(self, root: Path) -> None:
+        for rel in self.build_cache_targets(root):
+            copy_tree_fast(root / rel, ROOT / rel)
+
+    def restore_build_caches(self) -> None:
+        if not BUILD_CACHE_ENABLED:
+            return
+        store = CACHE_DIR / "build"
+        key = self.build_cache_key()
+        entry = store / key
+        if not (entry / "meta.json").exists():
+            candidates: list[tuple[float, Path]] = []
+            for meta_path in store.glob("*/meta.json") if store.is_dir() else []:
+                try:
+                    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                except Exception:
+                    continue
+                if meta.get("repo") == self.repo:
+                    candidates.append((float(meta.get("last_used", 0)), meta_path.parent))
+            if not candidates:
+                write_debug("build-cache.md", f"- ⚪ no build cache for `{key}`\n")
+                return
+            entry = max(candidates)[1]
+
+        meta_path = entry / "meta.json"
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            restored = []
+            for rel in meta.get("targets", []):
+                if not any(Path(rel).match(pattern) for pattern in BUILD_CACHE_PATTERNS):
+                    continue
+                if (entry / "files" / rel).exists():
+                    copy_tree_fast(entry / "files" / rel, ROOT / rel)
+                    restored.append(rel)
+            meta["last_used"] = time.time()
+            meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            source = "" if entry.name == key else f" (fallback from `{meta.get('branch')}`)"
+            write_debug("build-cache.md", f"- ✅ restored {len(restored)} build cache path(s){source}\n"
+                        + "".join(f"  - `{rel}`\n" for rel in restored))
+        except Exception as exc:
+            write_debug("build-cache-error.txt", f"Restore failed for {entry.name}: {exc}\n")
+
+    def save_build_caches(self) -> None:
+        if not BUILD_CACHE_ENABLED:
+            return
+        store = CACHE_DIR / "build"
+        key = self.build_cache_key()
+        entry = store / key
+        tmp = store / f".{key}.{os.getpid()}.tmp"
+        try:
+            shutil.rmtree(tmp, ignore_errors=True)
+            targets = self.build_cache_targets(ROOT)
+            if not targets:
+                return
+            for rel in targets:
+                copy_tree_fast(ROOT / rel, tmp / "files" / rel)
+            meta = {
+                "key": key,
+                "repo": self.repo,
+                "branch": git(["rev-parse", "--abbrev-ref", "HEAD"], check=False).strip(),
+                "targets": targets,
+                "size_bytes": dir_size_bytes(tmp / "files"),
+                "created": time.time(),
+                "last_used": time.time(),
+            }
+            (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+            evicted = evict_lru_entries(store, BUILD_CACHE_MAX_MB * 1024 * 1024)
+            if evicted:
+                write_debug("build-cache-evicted.txt", "\n".join(evicted) + "\n")
+        except Exception as exc:
+            shutil.rmtree(tmp, ignore_errors=True)
+            write_debug("build-cache-error.txt", f"Save failed for {key}: {exc}\n")
+
     def detect_install_commands(self) -> list[tuple[str, list[str]]]:
         commands: list[tuple[str, list[str]]] = []
 
@@ -1293,40 +3821,130 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
 
         return commands
 
-    def run_project_checks(self) -> bool:
-        summary: list[str] = ["Checks executed:", ""]
+    def changed_files_for_scope(self, root: Path = ROOT) -> list[str]:
+        changed = run_cmd(["git", "ls-files", "--modified", "--others",
+                           "--exclude-standard"], check=False, cwd=root).stdout.splitlines()
+        if self.mode in {"fix", "continue"}:
+            changed.extend(self.allowed_files)
+        return sorted({path.strip() for path in changed if path.strip()})
+
+    def affected_workspace_scope(self, root: Path = ROOT, out: Path = OUT) -> list[str] | None:
+        if self.workspace_packages is None:
+            self.workspace_packages = load_workspace_packages(ROOT)
+        changed = self.changed_files_for_scope(root)
+        scope = affected_packages(self.workspace_packages, changed)
+
+        lines = ["Affected workspace packages:", ""]
+        if scope is None:
+            lines.append(
+                "- full suite (no workspace index, no changes, or a changed file outside every package)")
+        else:
+            lines.extend(f"- {name} ({self.workspace_packages[name]['dir']})" for name in scope)
+        lines.extend(["", "Changed files:", "", *[f"- {path}" for path in changed]])
+        write_debug("affected-packages.md", "\n".join(lines) + "\n", out)
+        return scope
+
+    def run_project_checks(
+        self,
+        final: bool = False,
+        root: Path = ROOT,
+        out: Path = OUT,
+        cancel: threading.Event | None = None,
+        parallel: int = 1,
+    ) -> tuple[bool, bool]:
+        summary: list[str] = ["Checks executed:" if not final else "Checks executed (full verification):", ""]
+        reduced = False
         install_summary = (OUT / "install-summary.md")
         if install_summary.exists():
             summary.append(install_summary.read_text(
                 encoding="utf-8", errors="replace").strip())
             summary.append("")
 
-        if (ROOT / ".ella" / "checks.sh").exists():
+        if (root / ".ella" / "checks.sh").exists():
             checks = [("custom-checks", ["bash", ".ella/checks.sh"])]
         else:
-            checks = self.detect_check_commands()
+            scope = None if final else self.affected_workspace_scope(root, out)
+            checks = self.detect_check_commands(scope)
+            reduced = scope is not None and any(
+                "--filter=" in arg for _, cmd in checks for arg in cmd)
 
         if not checks:
             summary.append("- ⚪ no automatic checks detected")
-            write_debug("checks-summary.md", "\n".join(summary) + "\n")
-            return True
+            write_debug("checks-summary.md", "\n".join(summary) + "\n", out)
+            return True, False
+
+        if not final:
+            checks, narrowed = self.select_related_tests(checks, root, out)
+            reduced = reduced or narrowed
+        run_order = self.order_checks(checks, out) if CHECK_STATS_ENABLED else checks
+
+        warm = {} if final or root != ROOT else {
+            name: daemon for name, daemon in self.warm_checks.items() if daemon.alive()}
+        tree = working_tree_hash(root) if (CHECK_CACHE_ENABLED and not final) or warm else None
+        changed = set(self.changed_files_for_scope(root)) if warm else set()
+        cached_names: set[str] = set()
+        warm_names: set[str] = set()
+
+        workers = max(1, check_concurrency(len(checks)) // parallel)
+        shard_budget = max(1, check_concurrency(os.cpu_count() or 1) // parallel - (workers - 1))
+
+        def run_check(name: str, cmd: list[str], check_cancel: threading.Event) -> tuple[bool, str]:
+            key = self.check_cache_key(tree, name, cmd) if tree and CHECK_CACHE_ENABLED and not final else None
+            cached = self.load_check_result(key) if key else None
+            safe_name = re.sub(r"[^a-zA-Z0-9_.-]+", "-", name)
+            if cached is not None:
+                cached_names.add(name)
+                write_debug(f"check-{safe_name}.log",
+                            f"[cached result for tree {tree}]\n{cached[1]}\n", out)
+                return cached
+            answer = warm[name].query(tree, changed, 1500, check_cancel) if name in warm else None
+            if answer is not None:
+                warm_names.add(name)
+                write_debug(f"check-{safe_name}.log", f"[warm {name} result]\n{answer[1]}\n", out)
+                return answer
+            started = time.monotonic()
+            ok, log_tail, timed_out = self.run_test_check(
+                name, cmd, 1500, check_cancel, root, out, shard_budget)
+            if CHECK_STATS_ENABLED and not check_cancel.is_set():
+                self.record_check_stats(name, ok, time.monotonic() - started, log_tail)
+            if key and ok and not check_cancel.is_set() and not timed_out:
+                self.save_check_result(key, log_tail)
+            return ok, log_tail
+
+        results = run_check_graph(
+            run_order,
+            run_check,
+            max_workers=workers,
+            fail_fast=CHECKS_FAIL_FAST and not final,
+            abort=cancel,
+        )
 
         all_ok = True
-        for name, cmd in checks:
-            success, log_tail = self.run_logged_check(name, cmd, timeout=1500)
-            summary.append(f"- {'✅' if success else '❌'} {name}")
-            if not success:
-                all_ok = False
-                summary.append("")
-                summary.append(f"Last lines from {name}:")
-                summary.append("```txt")
-                summary.append(log_tail)
-                summary.append("```")
+        for name, _ in checks:
+            status, log_tail = results[name]
+            label = f"{name} (cached)" if name in cached_names else name
+            label = f"{name} (warm)" if name in warm_names else label
+            if status == "passed":
+                summary.append(f"- ✅ {label}")
+                continue
+            all_ok = False
+            if status == "skipped":
+                summary.append(f"- ⚪ {name} (skipped): {log_tail}")
+                continue
+            if status == "cancelled":
+                summary.append(f"- ⚪ {name} (cancelled)")
+                continue
+            summary.append(f"- ❌ {label}")
+            summary.append("")
+            summary.append(f"Last lines from {name}:")
+            summary.append("```txt")
+            summary.append(log_tail)
+            summary.append("```")
 
-        write_debug("checks-summary.md", "\n".join(summary) + "\n")
-        return all_ok
+        write_debug("checks-summary.md", "\n".join(summary) + "\n", out)
+        return all_ok, reduced or bool(warm_names)
 
-    def detect_check_commands(self) -> list[tuple[str, list[str]]]:
+    def detect_check_commands(self, scope: list[str] | None = None) -> list[tuple[str, list[str]]]:
         checks: list[tuple[str, list[str]]] = []
 
         if (ROOT / "package.json").exists():
@@ -1348,9 +3966,22 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
             else:
                 runner = ["npm", "run"]
 
-            for script in ["lint", "typecheck", "test", "build"]:
-                if script in scripts:
-                    checks.append((f"node-{script}", [*runner, script]))
+            for check, names in [("lint", ["lint"]), ("typecheck", ["typecheck", "type-check"]),
+                                 ("test", ["test"]), ("build", ["build"])]:
+                script = next((name for name in names if name in scripts), None)
+                if script is None:
+                    continue
+                cmd = [*runner, script]
+                match = TURBO_SCRIPT_RE.match(str(scripts[script]).strip()) if scope is not None else None
+                if match and match.group(2):
+                    filters = " ".join(shlex.quote(f"--filter={name}") for name in scope)
+                    cmd = ["bash", "-lc", 'PATH="$PWD/node_modules/.bin:$PATH"; '
+                           f"{match.group(1)} {filters} && {match.group(2)}"]
+                elif match:
+                    if runner[0] == "npm":
+                        cmd.append("--")
+                    cmd.extend(f"--filter={name}" for name in scope)
+                checks.append((f"node-{check}", cmd))
 
         if (ROOT / "go.mod").exists() and command_exists("go"):
             checks.append(
@@ -1410,37 +4041,437 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
 
         return checks
 
+    def check_stats_path(self) -> Path:
+        return CACHE_DIR / "check-stats" / f"{hashlib.sha256(self.repo.encode('utf-8')).hexdigest()[:24]}.json"
+
+    def load_check_stats(self) -> dict[str, dict[str, Any]]:
+        try:
+            return json.loads(self.check_stats_path().read_text(encoding="utf-8"))
+        except Exception:
+            return {}
+
+    def record_check_stats(self, name: str, ok: bool, seconds: float, log_tail: str) -> None:
+        path = self.check_stats_path()
+        with self.check_cache_lock:
+            data = self.load_check_stats()
+            entry = data.setdefault(name, {"runs": 0, "failures": 0, "seconds": seconds, "signatures": {}})
+            entry["runs"] += 1
+            entry["seconds"] = round(0.7 * entry["seconds"] + 0.3 * seconds, 3)
+            entry["last_failed"] = not ok
+            if not ok:
+                entry["failures"] += 1
+                signature = failure_signature(log_tail)
+                entry["signatures"][signature] = entry["signatures"].get(signature, 0) + 1
+                entry["last_signature"] = signature
+                entry["signatures"] = dict(sorted(entry["signatures"].items(), key=lambda x: -x[1])[:20])
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            except OSError as exc:
+                print(f"Could not save check stats: {exc}")
+
+    def order_checks(self, checks: list[tuple[str, list[str]]], out: Path) -> list[tuple[str, list[str]]]:
+        with self.check_cache_lock:
+            stats = self.load_check_stats()
+
+        def failure_rate(name: str) -> float:
+            entry = stats.get(name) or {}
+            rate = (entry.get("failures", 0) + 1) / (entry.get("runs", 0) + 2)
+            if entry.get("last_failed"):
+                recurring = entry.get("signatures", {}).get(entry.get("last_signature"), 0) > 1
+                rate = max(rate, 0.95 if recurring else 0.8)
+            return rate
+
+        def cost(item: tuple[int, tuple[str, list[str]]]) -> tuple[float, int]:
+            index, (name, _) = item
+            seconds = (stats.get(name) or {}).get("seconds")
+            if seconds is None:
+                return (0.0, index)
+            return (seconds / failure_rate(name), index)
+
+        ordered = [check for _, check in sorted(enumerate(checks), key=cost)]
+
+        lines = ["Check order (expected seconds per failure found, lowest first):", "",
+                 "| check | runs | failure rate | avg seconds | recurring failure |", "|---|---|---|---|---|"]
+        for name, _ in ordered:
+            entry = stats.get(name) or {}
+            recurring = entry.get("signatures", {}).get(entry.get("last_signature"), 0) if entry.get("last_failed") else 0
+            lines.append(
+                f"| {name} | {entry.get('runs', 0)} | {failure_rate(name):.2f} | "
+                f"{entry.get('seconds', 0):.1f} | {f'{recurring}x' if recurring > 1 else '-'} |")
+        write_debug("check-order.md", "\n".join(lines) + "\n", out)
+        return ordered
+
+    def test_durations_path(self) -> Path:
+        return CACHE_DIR / "test-durations" / f"{hashlib.sha256(self.repo.encode('utf-8')).hexdigest()[:24]}.json"
+
+    def load_test_durations(self, name: str) -> dict[str, Any]:
+        try:
+            data = json.loads(self.test_durations_path().read_text(encoding="utf-8"))
+            return data.get(name) or {}
+        except Exception:
+            return {}
+
+    def record_test_durations(self, name: str, total: float | None, items: dict[str, float]) -> None:
+        path = self.test_durations_path()
+        with self.check_cache_lock:
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                data = {}
+            entry = data.setdefault(name, {"items": {}})
+            if total is not None:
+                entry["total"] = round((entry.get("total", total) + total) / 2, 3)
+            for item, seconds in items.items():
+                previous = entry["items"].get(item, seconds)
+                entry["items"][item] = round((previous + seconds) / 2, 3)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+            except OSError as exc:
+                print(f"Could not save test durations: {exc}")
+
+    def test_shard_plan(
+        self, name: str, cmd: list[str], root: Path, budget: int,
+    ) -> tuple[list[list[str]], list[list[str]]] | None:
+        if name not in TEST_CHECKS or TEST_SHARDS == 1 or (budget < 2 and not TEST_SHARDS):
+            return None
+        history = self.load_test_durations(name)
+        durations: dict[str, float] = history.get("items") or {}
+
+        def shard_count(items: int | None) -> int:
+            count = TEST_SHARDS or budget
+            if not TEST_SHARDS and history.get("total"):
+                count = min(count, int(history["total"] // TEST_SHARD_MIN_SECONDS) + 1)
+            return min(count, items) if items is not None else count
+
+        if name == "node-test":
+            vitest = root / "node_modules" / ".bin" / "vitest"
+            try:
+                script = json.loads((root / "package.json").read_text(encoding="utf-8"))["scripts"]["test"]
+            except Exception:
+                return None
+            if "related" in cmd or not vitest.exists() or not VITEST_SCRIPT_RE.match(str(script).strip()):
+                return None
+            count = shard_count(None)
+            if count < 2:
+                return None
+            commands = [[str(vitest), "run", f"--shard={i}/{count}", "--passWithNoTests"]
+                        for i in range(1, count + 1)]
+            return commands, [[] for _ in commands]
+
+        if name == "python-pytest":
+            base = [arg for arg in cmd if not arg.endswith(".py")]
+            items = [arg for arg in cmd[len(base):] if arg.endswith(".py")] if len(base) < len(cmd) else []
+            if not items:
+                collected = run_cmd([*base, "--collect-only", "-q"], check=False, cwd=root,
+                                    timeout=300, env=clean_env_for_checks())
+                if collected.returncode != 0:
+                    return None
+                paths = (re.split(r"::|: \d", line, maxsplit=1)[0] for line in collected.stdout.splitlines())
+                items = sorted({path for path in paths if path.endswith(".py")})
+        elif name == "go-test":
+            patterns = [arg for arg in cmd[2:] if is_go_package_pattern(arg)]
+            base = [arg for arg in cmd if not is_go_package_pattern(arg)]
+            listed = run_cmd(["go", "list", *(patterns or ["./..."])], check=False, cwd=root, timeout=300)
+            items = [line.strip() for line in listed.stdout.splitlines() if line.strip()]
+        else:
+            return None
+
+        count = shard_count(len(items))
+        if count < 2:
+            return None
+        shards = balance_shards(items, durations, count)
+        return [[*base, *members] for members in shards], shards
+
+    def run_test_check(
+        self,
+        name: str,
+        cmd: list[str],
+        timeout: int,
+        cancel: threading.Event,
+        root: Path,
+        out: Path,
+        budget: int,
+    ) -> tuple[bool, str, bool]:
+        start = time.monotonic()
+        full = "related" not in cmd and not any(arg.endswith(".py") for arg in cmd)
+        plan = self.test_shard_plan(name, cmd, root, budget)
+        if plan is None:
+            ok, log_tail, timed_out = self.run_logged_command(
+                name, cmd, timeout=timeout, cancel=cancel, cwd=root, out=out)
+            if name in TEST_CHECKS and full and not cancel.is_set():
+                self.record_test_durations(name, time.monotonic() - start, {})
+            return ok, log_tail, timed_out
+
+        commands, shards = plan
+        count = len(commands)
+        timings: list[float] = [0.0] * count
+
+        safe_name = re.sub(r"[^a-zA-Z0-9_.-]+", "-", name)
+        reports = [out / f"junit-{safe_name}-shard-{index + 1}.xml" for index in range(count)]
+
+        def run_shard(index: int) -> tuple[bool, str, bool]:
+            shard_start = time.monotonic()
+            command = commands[index]
+            if name == "python-pytest":
+                command = [*command, f"--junitxml={reports[index]}", "-o", "junit_family=xunit1"]
+            result = self.run_logged_command(f"{name}-shard-{index + 1}", command, timeout=timeout,
+                                             cancel=cancel, cwd=root, out=out)
+            timings[index] = time.monotonic() - shard_start
+            return result
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=count) as pool:
+            results = list(pool.map(run_shard, range(count)))
+
+        order = sorted(range(count), key=lambda i: results[i][0], reverse=True)
+        sections = []
+        for index in order:
+            ok, tail, _ = results[index]
+            header = f"[{name} shard {index + 1}/{count}: {'passed' if ok else 'failed'}, {timings[index]:.1f}s]"
+            sections.append(header if ok else f"{header}\n{tail}")
+        log_tail = "\n".join(sections)
+        write_debug(f"check-{safe_name}.log", log_tail + "\n", out)
+
+        if not cancel.is_set():
+            per_item: dict[str, float] = {}
+            for index, members in enumerate(shards):
+                if name == "python-pytest":
+                    measured = junit_file_durations(reports[index])
+                elif name == "go-test":
+                    shard_log = out / f"check-{safe_name}-shard-{index + 1}.log"
+                    measured = go_package_durations(shard_log.read_text(encoding="utf-8", errors="replace"))
+                else:
+                    measured = {}
+                per_item.update((item, measured[item]) for item in members if item in measured)
+            self.record_test_durations(name, sum(timings) if full else None, per_item)
+        return all(r[0] for r in results), log_tail, any(r[2] for r in results)
+
+    def select_related_tests(
+        self, checks: list[tuple[str, list[str]]], root: Path, out: Path,
+    ) -> tuple[list[tuple[str, list[str]]], bool]:
+        changed = [path for path in run_cmd(["git", "ls-files", "--modified", "--others", "--exclude-standard"],
+                                            check=False, cwd=root).stdout.splitlines() if path.strip()]
+        if self.mode in {"fix", "continue"}:
+            changed = sorted({*changed, *self.allowed_files})
+        lines = ["Related test selection:", ""]
+        if not changed or any(RELATED_FULL_SUITE_RE.search(path) for path in changed):
+            lines.append("- full suite (no changes, or a config, manifest or conftest file changed)")
+            write_debug("related-tests.md", "\n".join(lines) + "\n", out)
+            return checks, False
+
+        existing = [path for path in changed if (root / path).exists()]
+        selected: list[tuple[str, list[str]]] = []
+        narrowed = False
+        for name, cmd in checks:
+            if name == "node-test":
+                vitest = root / "node_modules" / ".bin" / "vitest"
+                outside = [path for path in changed if path not in existing or not path.endswith(RELATED_JS_EXTENSIONS)]
+                try:
+                    script = json.loads((root / "package.json").read_text(encoding="utf-8"))["scripts"]["test"]
+                except Exception:
+                    script = ""
+                if outside:
+                    lines.append(f"- {name}: full suite, `{outside[0]}` is deleted or not a JS module")
+                elif vitest.exists() and VITEST_SCRIPT_RE.match(str(script).strip()):
+                    cmd = [str(vitest), "related", "--run", "--passWithNoTests", *existing]
+                    lines.append(f"- {name}: vitest related for {len(existing)} changed file(s)")
+                    narrowed = True
+            elif name == "python-pytest":
+                py_files = [path for path in run_cmd(["git", "ls-files", "--cached", "--others", "--exclude-standard",
+                                                      "--", "*.py"], check=False, cwd=root).stdout.splitlines()
+                            if path.strip()]
+                outside = [path for path in changed if path not in py_files]
+                if outside:
+                    lines.append(f"- {name}: full suite, `{outside[0]}` is not a tracked Python module")
+                else:
+                    sources = {path: read_text_limited(root / path, 2_000_000) for path in py_files}
+                    tests = [path for path in related_python_tests(sources, changed) if (root / path).exists()]
+                    if tests:
+                        cmd = [*cmd, *tests]
+                        lines.append(f"- {name}: {len(tests)} test file(s) import the changed modules")
+                        lines.extend(f"  - `{path}`" for path in tests)
+                        narrowed = True
+            selected.append((name, cmd))
+
+        if not narrowed:
+            lines.append("- full suite (no test check could be narrowed to the changed files)")
+        write_debug("related-tests.md", "\n".join(lines) + "\n", out)
+        return selected, narrowed
+
+    def detect_warm_checks(self) -> list[WarmCheck]:
+        if (ROOT / ".ella" / "checks.sh").exists() or not (ROOT / "package.json").exists():
+            return []
+        try:
+            scripts = json.loads((ROOT / "package.json").read_text(encoding="utf-8")).get("scripts") or {}
+        except Exception:
+            return []
+
+        daemons: list[WarmCheck] = []
+        tsc = ROOT / "node_modules" / ".bin" / "tsc"
+        match = TSC_SCRIPT_RE.match(str(scripts.get("typecheck", scripts.get("type-check", ""))).strip())
+        if match and tsc.exists():
+            args = [arg for arg in match.group(1).split() if arg not in {"--watch", "-w", "--pretty"}]
+            daemons.append(WarmCheck(
+                "node-typecheck", "tsc",
+                [str(tsc), *args, "--watch", "--preserveWatchOutput", "--pretty", "false"],
+                OUT / "warm-node-typecheck.log"))
+
+        match = VITEST_SCRIPT_RE.match(str(scripts.get("test", "")).strip())
+        if match and (ROOT / "node_modules" / "vitest").exists() and command_exists("node"):
+            helper = ROOT / "node_modules" / ".ella-warm-vitest.mjs"
+            helper.write_text(WARM_VITEST_HELPER, encoding="utf-8")
+            daemons.append(WarmCheck(
+                "node-test", "vitest",
+                ["node", str(helper), *([match.group(1).strip()] if match.group(1) else [])],
+                OUT / "warm-node-test.log"))
+        return daemons
+
+    def start_warm_checks(self) -> None:
+        if not WARM_CHECKS_ENABLED or self.warm_checks:
+            return
+        lines = ["Warm check daemons:", ""]
+        for daemon in self.detect_warm_checks():
+            try:
+                daemon.start()
+            except OSError as exc:
+                lines.append(f"- ❌ {daemon.name}: {exc}")
+                continue
+            self.warm_checks[daemon.name] = daemon
+            lines.append(f"- {daemon.name}: `{' '.join(daemon.cmd)}`")
+        if len(lines) == 2:
+            lines.append("- none (no direct tsc or vitest script in package.json)")
+        write_debug("warm-checks.md", "\n".join(lines) + "\n")
+
+    def stop_warm_checks(self) -> None:
+        daemons, self.warm_checks = self.warm_checks, {}
+        for daemon in daemons.values():
+            daemon.close()
+        (ROOT / "node_modules" / ".ella-warm-vitest.mjs").unlink(missing_ok=True)
+
     def python_module_exists(self, module: str) -> bool:
         result = run_cmd(
             [sys.executable, "-c", f"import {module}"], check=False, capture=True, timeout=30, env=clean_env_for_checks())
         return result.returncode == 0
 
-    def run_logged_check(self, name: str, cmd: list[str], timeout: int = 900) -> tuple[bool, str]:
+    def toolchain_version(self, program: str) -> str:
+        with self.check_cache_lock:
+            if program in self.toolchain_versions:
+                return self.toolchain_versions[program]
+        version = ""
+        if command_exists(program):
+            args = [program, "version"] if program == "go" else [program, "--version"]
+            version = run_cmd(args, check=False, timeout=60).stdout.strip()[:500]
+        with self.check_cache_lock:
+            self.toolchain_versions[program] = version
+        return version
+
+    def check_cache_key(self, tree: str, name: str, cmd: list[str]) -> str:
+        programs = [cmd[0]]
+        if cmd[0] in {"pnpm", "npm", "npx", "yarn", "bun", "bash"}:
+            programs.append("node")
+        digest = hashlib.sha256()
+        for part in [tree, name, json.dumps(cmd), *(self.toolchain_version(p) for p in programs)]:
+            digest.update(part.encode("utf-8") + b"\0")
+        return digest.hexdigest()[:40]
+
+    def load_check_result(self, key: str) -> tuple[bool, str] | None:
+        with self.check_cache_lock:
+            if key in self.check_results:
+                return self.check_results[key]
+        meta_path = CACHE_DIR / "checks" / key / "meta.json"
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("ok") is not True:
+                return None
+            meta["last_used"] = time.time()
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+        except Exception:
+            return None
+        result = (True, str(meta["log_tail"]))
+        with self.check_cache_lock:
+            self.check_results[key] = result
+        return result
+
+    def save_check_result(self, key: str, log_tail: str) -> None:
+        with self.check_cache_lock:
+            self.check_results[key] = (True, log_tail)
+        store = CACHE_DIR / "checks"
+        meta = {"ok": True, "log_tail": log_tail, "last_used": time.time(), "size_bytes": len(log_tail) + 200}
+        try:
+            (store / key).mkdir(parents=True, exist_ok=True)
+            (store / key / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+            with self.check_cache_lock:
+                evict_lru_entries(store, CHECK_CACHE_MAX_MB * 1024 * 1024)
+        except OSError as exc:
+            print(f"Could not save the check result cache: {exc}")
+
+    def run_logged_check(
+        self,
+        name: str,
+        cmd: list[str],
+        timeout: int = 900,
+        cancel: threading.Event | None = None,
+        cwd: Path = ROOT,
+        out: Path = OUT,
+    ) -> tuple[bool, str]:
+        ok, log_tail, _ = self.run_logged_command(name, cmd, timeout, cancel, cwd, out)
+        return ok, log_tail
+
+    def run_logged_command(
+        self,
+        name: str,
+        cmd: list[str],
+        timeout: int = 900,
+        cancel: threading.Event | None = None,
+        cwd: Path = ROOT,
+        out: Path = OUT,
+    ) -> tuple[bool, str, bool]:
         safe_name = re.sub(r"[^a-zA-Z0-9_.-]+", "-", name)
-        log_path = OUT / f"check-{safe_name}.log"
+        log_path = out / f"check-{safe_name}.log"
         print(f"Running {name}...")
 
         try:
-            result = subprocess.run(
-                cmd,
-                cwd=ROOT,
-                text=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                timeout=timeout,
-                env=clean_env_for_checks(),
-            )
-            log_path.write_text(result.stdout or "",
-                                encoding="utf-8", errors="replace")
-            return result.returncode == 0, tail_text(log_path, 120)
-        except subprocess.TimeoutExpired as exc:
-            output = (exc.stdout or "") if isinstance(exc.stdout, str) else ""
-            output += f"\nCommand timed out after {timeout}s.\n"
-            log_path.write_text(output, encoding="utf-8", errors="replace")
-            return False, tail_text(log_path, 120)
+            with log_path.open("w", encoding="utf-8", errors="replace") as log:
+                proc = subprocess.Popen(
+                    cmd,
+                    cwd=cwd,
+                    text=True,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    env=clean_env_for_checks(),
+                    start_new_session=True,
+                )
+                deadline = time.monotonic() + timeout
+                note = ""
+                timed_out = False
+                while True:
+                    try:
+                        returncode = proc.wait(timeout=0.5)
+                        break
+                    except subprocess.TimeoutExpired:
+                        pass
+                    if cancel is not None and cancel.is_set():
+                        note = "Check cancelled."
+                    elif time.monotonic() >= deadline:
+                        note = f"Command timed out after {timeout}s."
+                        timed_out = True
+                    if note:
+                        self.kill_process_group(proc)
+                        log.write(f"\n{note}\n")
+                        break
+            return not note and returncode == 0, tail_text(log_path, 120), timed_out
         except Exception as exc:
             log_path.write_text(str(exc), encoding="utf-8", errors="replace")
-            return False, str(exc)
+            return False, str(exc), False
+
+    @staticmethod
+    def kill_process_group(proc: subprocess.Popen[str]) -> None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            proc.kill()
+        proc.wait()
 
     def infer_commit_type(self, changed_files: list[str]) -> tuple[str, str | None]:
         normalized = [path.replace("\\", "/") for path in changed_files]
@@ -1676,31 +4707,32 @@ On an issue, I create a branch, try to solve it, run checks, and open a PR."""
             raise RuntimeError("Issue info missing")
         title = self.issue_info.get("title", f"Issue #{self.issue_number}")
         body = f"Closes #{self.issue_number}\n\n{self.final_summary}"
-        out = gh([
-            "pr",
-            "create",
-            "--repo",
-            self.repo,
-            "--base",
-            self.default_branch,
-            "--head",
-            self.solve_branch,
-            "--title",
-            f"Fix issue #{self.issue_number}: {title}",
-            "--body",
-            body,
-        ])
-        return out.strip()
+        created = self.github.api(
+            "POST",
+            f"repos/{self.repo}/pulls",
+            body={
+                "base": self.default_branch,
+                "head": self.solve_branch,
+                "title": f"Fix issue #{self.issue_number}: {title}",
+                "body": body,
+            },
+        )
+        return str(created.get("html_url", "")).strip()
 
 
 def main() -> int:
+    ella: Ella | None = None
     try:
-        Ella().run()
+        ella = Ella()
+        ella.run()
         return 0
     except Exception as exc:
         write_debug("fatal-error.txt", f"{type(exc).__name__}: {exc}\n")
         print(f"Fatal error: {exc}", file=sys.stderr)
         return 1
+    finally:
+        if ella:
+            ella.close()
 
 
 if __name__ == "__main__":
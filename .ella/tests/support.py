@@ -0,0 +1,71 @@
+import http.server
+import json
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+os.environ.setdefault("RUNNER_TEMP", tempfile.mkdtemp(prefix="ella-test-runner-"))
+os.environ.setdefault("ELLA_CACHE_DIR", tempfile.mkdtemp(prefix="ella-test-cache-"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import agent  # noqa: E402
+
+
+def make_ella(repo: str = "owner/repo") -> agent.Ella:
+    event = Path(tempfile.mkdtemp(prefix="ella-test-event-")) / "event.json"
+    event.write_text(json.dumps({
+        "issue": {"number": 1},
+        "comment": {"id": 2, "body": "/ella help"},
+        "repository": {"default_branch": "main"},
+    }), encoding="utf-8")
+    os.environ["GITHUB_EVENT_PATH"] = str(event)
+    os.environ["GITHUB_REPOSITORY"] = repo
+    return agent.Ella()
+
+
+class FakeServer:
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests: list[dict] = []
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def handle_any(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                request = {
+                    "method": self.command,
+                    "path": self.path,
+                    "headers": dict(self.headers),
+                    "body": json.loads(body) if body else None,
+                    "client": self.client_address,
+                }
+                server.requests.append(request)
+                status, headers, payload = server.respond(request)
+                if isinstance(payload, (dict, list)):
+                    payload = json.dumps(payload)
+                    headers = {"Content-Type": "application/json", **headers}
+                data = payload.encode("utf-8") if isinstance(payload, str) else payload
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = handle_any
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
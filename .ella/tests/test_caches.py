@@ -0,0 +1,129 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from support import agent, make_ella
+
+
+def temp_dir(prefix: str) -> Path:
+    return Path(tempfile.mkdtemp(prefix=f"ella-test-{prefix}-"))
+
+
+def write_in_place(path: Path, text: str) -> None:
+    with path.open("r+", encoding="utf-8") as f:
+        f.write(text)
+
+
+class CopyTreeFastTest(unittest.TestCase):
+    def test_copied_tree_does_not_share_files_with_source(self):
+        src = temp_dir("src")
+        (src / "pkg").mkdir()
+        (src / "pkg" / "index.js").write_text("original", encoding="utf-8")
+        dst = temp_dir("dst") / "copy"
+
+        agent.copy_tree_fast(src, dst)
+        write_in_place(dst / "pkg" / "index.js", "CHANGED!")
+
+        self.assertEqual((src / "pkg" / "index.js").read_text(encoding="utf-8"), "original")
+
+    def test_copies_single_files_and_replaces_existing_targets(self):
+        src = temp_dir("src") / ".eslintcache"
+        src.write_text("new", encoding="utf-8")
+        dst = temp_dir("dst") / ".eslintcache"
+        dst.write_text("old", encoding="utf-8")
+
+        agent.copy_tree_fast(src, dst)
+
+        self.assertEqual(dst.read_text(encoding="utf-8"), "new")
+        self.assertNotEqual(src.stat().st_ino, dst.stat().st_ino)
+
+
+class InstallCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = temp_dir("root")
+        self.cache = temp_dir("cache")
+        for name, value in (("ROOT", self.root), ("CACHE_DIR", self.cache)):
+            patcher = mock.patch.object(agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ella = make_ella()
+        self.ella.install_cache_targets = lambda manager: ["node_modules"]
+
+    def test_restored_install_is_independent_of_the_store(self):
+        modules = self.root / "node_modules" / "dep"
+        modules.mkdir(parents=True)
+        (modules / "index.js").write_text("v1", encoding="utf-8")
+
+        self.ella.save_install_cache("npm-key", "npm")
+        agent.shutil.rmtree(self.root / "node_modules")
+        self.assertTrue(self.ella.restore_install_cache("npm-key"))
+        write_in_place(modules / "index.js", "v2")
+
+        stored = self.cache / "install" / "npm-key" / "files" / "node_modules" / "dep" / "index.js"
+        self.assertEqual(stored.read_text(encoding="utf-8"), "v1")
+
+    def test_missing_entry_is_a_miss(self):
+        self.assertFalse(self.ella.restore_install_cache("absent"))
+
+
+class BuildCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = temp_dir("root")
+        self.cache = temp_dir("cache")
+        for name, value in (("ROOT", self.root), ("CACHE_DIR", self.cache)):
+            patcher = mock.patch.object(agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ella = make_ella()
+        self.ella.workspace_packages = {}
+
+    def test_round_trip_survives_in_place_rewrites(self):
+        (self.root / ".eslintcache").write_text("lint-1", encoding="utf-8")
+        (self.root / ".turbo" / "cache").mkdir(parents=True)
+        (self.root / ".turbo" / "cache" / "a.tar").write_text("turbo", encoding="utf-8")
+
+        self.ella.save_build_caches()
+        (self.root / ".eslintcache").unlink()
+        agent.shutil.rmtree(self.root / ".turbo")
+        self.ella.restore_build_caches()
+        write_in_place(self.root / ".eslintcache", "LINT-2")
+        self.ella.restore_build_caches()
+
+        self.assertEqual((self.root / ".eslintcache").read_text(encoding="utf-8"), "lint-1")
+        self.assertEqual((self.root / ".turbo" / "cache" / "a.tar").read_text(encoding="utf-8"), "turbo")
+
+    def test_typescript_build_info_is_not_cached_without_its_outputs(self):
+        (self.root / "tsconfig.tsbuildinfo").write_text("{}", encoding="utf-8")
+        (self.root / "dist").mkdir()
+        (self.root / "dist" / "tsconfig.tsbuildinfo").write_text("{}", encoding="utf-8")
+
+        self.assertEqual(self.ella.build_cache_targets(self.root), [])
+
+    def test_entries_saved_with_build_info_do_not_restore_it(self):
+        (self.root / ".eslintcache").write_text("lint", encoding="utf-8")
+        (self.root / "tsconfig.tsbuildinfo").write_text("{}", encoding="utf-8")
+        with mock.patch.object(agent, "BUILD_CACHE_PATTERNS", [*agent.BUILD_CACHE_PATTERNS, "*.tsbuildinfo"]):
+            self.ella.save_build_caches()
+        (self.root / ".eslintcache").unlink()
+        (self.root / "tsconfig.tsbuildinfo").unlink()
+
+        self.ella.restore_build_caches()
+
+        self.assertTrue((self.root / ".eslintcache").exists())
+        self.assertFalse((self.root / "tsconfig.tsbuildinfo").exists())
+
+    def test_saves_caches_produced_in_the_winning_worktree(self):
+        worktree = temp_dir("worktree")
+        (worktree / ".eslintcache").write_text("from-candidate", encoding="utf-8")
+
+        self.ella.adopt_build_caches(worktree)
+        self.ella.save_build_caches()
+        (self.root / ".eslintcache").unlink()
+        self.ella.restore_build_caches()
+
+        self.assertEqual((self.root / ".eslintcache").read_text(encoding="utf-8"), "from-candidate")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from support import agent, make_ella
+
+
+def passing(name, cmd, cancel):
+    return True, f"{name} ok"
+
+
+class CheckGraphTest(unittest.TestCase):
+    def test_dependents_of_a_failed_check_are_skipped(self):
+        def run(name, cmd, cancel):
+            return name != "node-typecheck", name
+
+        results = agent.run_check_graph(
+            [("node-typecheck", []), ("node-build", []), ("node-lint", [])],
+            run, max_workers=2, fail_fast=False)
+        self.assertEqual(results["node-typecheck"][0], "failed")
+        self.assertEqual(results["node-build"][0], "skipped")
+        self.assertEqual(results["node-lint"][0], "passed")
+
+    def test_fail_fast_skips_pending_checks(self):
+        def run(name, cmd, cancel):
+            return name != "a", name
+
+        results = agent.run_check_graph([("a", []), ("b", []), ("c", [])], run, max_workers=1, fail_fast=True)
+        self.assertEqual([results[n][0] for n in "abc"], ["failed", "skipped", "skipped"])
+
+    def test_never_exceeds_max_workers(self):
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def run(name, cmd, cancel):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return True, ""
+
+        results = agent.run_check_graph([(str(i), []) for i in range(6)], run, max_workers=2, fail_fast=False)
+        self.assertTrue(all(status == "passed" for status, _ in results.values()))
+        self.assertLessEqual(active[1], 2)
+
+    def test_abort_cancels_everything_pending(self):
+        abort = threading.Event()
+        abort.set()
+        results = agent.run_check_graph([("a", []), ("b", [])], passing, max_workers=1, fail_fast=False, abort=abort)
+        self.assertEqual({status for status, _ in results.values()}, {"cancelled"})
+
+
+class RunProjectChecksTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="ella-test-root-"))
+        self.out = Path(tempfile.mkdtemp(prefix="ella-test-out-"))
+        self.cache = mock.patch.object(agent, "CACHE_DIR", Path(tempfile.mkdtemp(prefix="ella-test-cache-")))
+        self.cache.start()
+        self.addCleanup(self.cache.stop)
+        self.ella = make_ella()
+
+    def test_summary_keeps_detected_order_when_stats_reorder_runs(self):
+        checks = [(name, [sys.executable, "-c", "pass"]) for name in ["lint", "typecheck", "test"]]
+        self.ella.detect_check_commands = lambda scope=None: checks
+        self.ella.record_check_stats("test", False, 0.1, "boom")
+        self.ella.record_check_stats("lint", True, 30.0, "")
+
+        started = []
+        original = self.ella.run_test_check
+
+        def record(name, *args):
+            started.append(name)
+            return original(name, *args)
+
+        self.ella.run_test_check = record
+        with mock.patch.object(agent, "CHECK_CONCURRENCY", 1):
+            ok, _ = self.ella.run_project_checks(final=True, root=self.root, out=self.out)
+
+        self.assertTrue(ok)
+        self.assertEqual(started, ["typecheck", "test", "lint"])
+        summary = (self.out / "checks-summary.md").read_text(encoding="utf-8")
+        self.assertLess(summary.index("lint"), summary.index("typecheck"))
+        self.assertLess(summary.index("typecheck"), summary.index("- ✅ test"))
+
+    def test_check_cache_replays_passes_but_not_failures(self):
+        marker = self.out / "runs.txt"
+        script = (f"import pathlib; p = pathlib.Path({str(marker)!r}); "
+                  "n = len(p.read_text()) if p.exists() else 0; p.write_text('x' * (n + 1)); "
+                  "raise SystemExit(1 if n == 0 else 0)")
+        self.ella.detect_check_commands = lambda scope=None: [("flaky", [sys.executable, "-c", script])]
+        agent.run_cmd(["git", "init", "-q"], cwd=self.root)
+
+        with mock.patch.object(agent, "CHECK_CACHE_ENABLED", True):
+            results = [self.ella.run_project_checks(root=self.root, out=self.out)[0] for _ in range(3)]
+            self.ella.check_results.clear()
+            results.append(self.ella.run_project_checks(root=self.root, out=self.out)[0])
+
+        self.assertEqual(results, [False, True, True, True])
+        self.assertEqual(marker.read_text(), "xx")
+
+
+class TestShardTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="ella-test-root-"))
+        self.out = Path(tempfile.mkdtemp(prefix="ella-test-out-"))
+        mock.patch.object(agent, "CACHE_DIR", Path(tempfile.mkdtemp(prefix="ella-test-cache-"))).start()
+        mock.patch.object(agent, "TEST_SHARDS", 2).start()
+        self.addCleanup(mock.patch.stopall)
+        self.ella = make_ella()
+
+    def test_go_shards_keep_the_original_flags(self):
+        listed = agent.subprocess.CompletedProcess([], 0, stdout="example.com/a\nexample.com/b\n")
+        with mock.patch.object(agent, "run_cmd", return_value=listed) as run_cmd:
+            commands, shards = self.ella.test_shard_plan(
+                "go-test", ["go", "test", "-race", "-count=1", "./pkg/..."], self.root, 4)
+
+        self.assertEqual(run_cmd.call_args.args[0], ["go", "list", "./pkg/..."])
+        self.assertEqual(sorted(sum(shards, [])), ["example.com/a", "example.com/b"])
+        for command, members in zip(commands, shards):
+            self.assertEqual(command, ["go", "test", "-race", "-count=1", *members])
+
+    def test_go_durations_come_from_package_results(self):
+        text = "ok  \texample.com/a\t1.50s\nok  \texample.com/b\t(cached)\nFAIL\texample.com/c\t0.25s\n"
+        self.assertEqual(agent.go_package_durations(text), {"example.com/a": 1.5, "example.com/c": 0.25})
+
+    def test_pytest_shards_record_measured_file_durations(self):
+        tests = self.root / "tests"
+        tests.mkdir()
+        (tests / "test_slow.py").write_text("import time\n\ndef test_slow():\n    time.sleep(0.3)\n")
+        (tests / "test_fast.py").write_text("def test_fast():\n    pass\n")
+
+        ok, _, timed_out = self.ella.run_test_check(
+            "python-pytest", [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider"],
+            120, threading.Event(), self.root, self.out, 2)
+
+        self.assertTrue(ok)
+        self.assertFalse(timed_out)
+        items = self.ella.load_test_durations("python-pytest")["items"]
+        self.assertEqual(set(items), {"tests/test_slow.py", "tests/test_fast.py"})
+        self.assertGreaterEqual(items["tests/test_slow.py"], 0.3)
+        self.assertLess(items["tests/test_fast.py"], 0.3)
+
+    def test_shard_budget_leaves_room_for_other_checks(self):
+        checks = [(name, [sys.executable, "-c", "pass"]) for name in ["lint", "typecheck", "python-pytest"]]
+        self.ella.detect_check_commands = lambda scope=None: checks
+        budgets = []
+
+        def record(name, cmd, timeout, cancel, root, out, budget):
+            budgets.append(budget)
+            return True, "", False
+
+        self.ella.run_test_check = record
+        with mock.patch.object(agent, "CHECK_CONCURRENCY", 8), mock.patch.object(agent.os, "cpu_count", return_value=16):
+            self.ella.run_project_checks(final=True, root=self.root, out=self.out)
+
+        self.assertEqual(budgets, [6, 6, 6])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from support import agent, make_ella
+
+
+class PackContextFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="ella-test-root-"))
+        self.out = Path(tempfile.mkdtemp(prefix="ella-test-out-"))
+        for name, value in (("ROOT", self.root), ("OUT", self.out)):
+            patcher = mock.patch.object(agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ella = make_ella()
+        self.ella.preselected_files = []
+        self.ella.feedback = "FAIL src/failing.py:3 AssertionError"
+        for rel, size in (("src/failing.py", 400), ("src/small.py", 40), ("src/medium.py", 200), ("src/large.py", 800)):
+            (self.root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / rel).write_text("x" * size + "\n", encoding="utf-8")
+        self.paths = ["src/large.py", "src/medium.py", "src/failing.py", "src/small.py"]
+
+    def cost(self, rel):
+        return agent.estimate_tokens(self.ella.file_block(rel))
+
+    def test_fills_the_budget_by_rank_and_lists_what_was_left_out(self):
+        budget = sum(self.cost(rel) for rel in ["src/failing.py", "src/small.py", "src/medium.py"])
+
+        packed, rows = self.ella.pack_context_files(self.paths, budget)
+
+        self.assertEqual([row[0] for row in rows], [
+            "file src/failing.py (named in check output)",
+            "file src/small.py (other)",
+            "file src/medium.py (other)",
+            "file src/large.py (other)",
+        ])
+        self.assertEqual([row[2] for row in rows], ["included", "included", "included", "omitted"])
+        self.assertEqual(packed[:3], [self.ella.file_block(rel) for rel in ["src/medium.py", "src/failing.py", "src/small.py"]])
+        self.assertTrue(packed[3].endswith("needs_files if you need them:\nsrc/large.py"))
+
+    def test_a_file_over_the_remaining_budget_does_not_stop_smaller_ones(self):
+        budget = self.cost("src/small.py") + self.cost("src/medium.py")
+        self.assertGreater(self.cost("src/failing.py"), budget)
+
+        packed, rows = self.ella.pack_context_files(self.paths, budget)
+
+        self.assertEqual({row[0].split()[1]: row[2] for row in rows}, {
+            "src/failing.py": "omitted",
+            "src/small.py": "included",
+            "src/medium.py": "included",
+            "src/large.py": "omitted",
+        })
+        self.assertTrue(packed[-1].endswith(":\nsrc/failing.py\nsrc/large.py"))
+
+    def test_everything_fits_without_an_omitted_list(self):
+        packed, rows = self.ella.pack_context_files(self.paths, 10_000)
+
+        self.assertEqual(len(packed), 4)
+        self.assertEqual({row[2] for row in rows}, {"included"})
+
+
+class LineWindowsTest(unittest.TestCase):
+    def test_merges_nearby_windows_and_marks_hidden_lines(self):
+        text = "\n".join(f"v = {n}" for n in range(1, 101))
+
+        view = agent.render_line_windows(text, [(20, 20), (24, 24), (80, 80)], 2, expand=False)
+
+        lines = view.splitlines()
+        self.assertEqual(lines[0], "... | [lines 1-17 not shown]")
+        self.assertEqual(lines[1:10], [f"{n:>3} | v = {n}" for n in range(18, 27)])
+        self.assertEqual(lines[10], "... | [lines 27-77 not shown]")
+        self.assertEqual(lines[11:16], [f"{n:>3} | v = {n}" for n in range(78, 83)])
+        self.assertEqual(lines[16:], ["... | [lines 83-100 not shown]"])
+
+    def test_expands_to_the_enclosing_block(self):
+        text = "import os\n\n\ndef first():\n    a = 1\n    b = 2\n    return a + b\n\n\ndef second():\n    pass\n"
+
+        view = agent.render_line_windows(text, [(6, 6)], 0)
+
+        self.assertEqual(view.splitlines(), [
+            ".. | [lines 1-3 not shown]",
+            " 4 | def first():",
+            " 5 |     a = 1",
+            " 6 |     b = 2",
+            " 7 |     return a + b",
+            " 8 | ",
+            " 9 | ",
+            ".. | [lines 10-11 not shown]",
+        ])
+
+
+class FileWindowsTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="ella-test-root-"))
+        self.out = Path(tempfile.mkdtemp(prefix="ella-test-out-"))
+        for name, value in (("ROOT", self.root), ("OUT", self.out), ("FILE_WINDOW_LINES", 50), ("FILE_WINDOW_RADIUS", 2)):
+            patcher = mock.patch.object(agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        (self.root / "src").mkdir()
+        (self.root / "src" / "big.py").write_text("".join(
+            f"def f{n}():\n" if n % 10 == 1 else f"    v = {n}\n" for n in range(1, 301)), encoding="utf-8")
+        self.ella = make_ella()
+
+    def test_large_files_show_windows_around_failing_lines(self):
+        self.ella.feedback = 'File "src/big.py", line 120, in <module>\nsrc/big.py:200: error'
+
+        block = self.ella.file_block("src/big.py")
+
+        self.assertIn("----- FILE WINDOWS: src/big.py (300 lines) -----", block)
+        shown = [line.split(" | ")[0].strip() for line in block.splitlines() if line[:3].strip().isdigit()]
+        self.assertEqual(shown, [str(n) for n in [*range(109, 123), *range(189, 203)]])
+
+    def test_requested_line_range_shows_exactly_those_lines(self):
+        (self.out / "needed-files.txt").write_text("src/big.py:12-10\n", encoding="utf-8")
+
+        specs = self.ella.collect_requests(self.out)
+        block = self.ella.render_request_blocks(specs)[0]
+
+        self.assertEqual(specs[0]["range"], [10, 12])
+        self.assertIn("----- REQUESTED LINES: src/big.py:10-12 -----", block)
+        self.assertIn("... | [lines 1-9 not shown]\n 10 |     v = 10\n 11 | def f11():\n 12 |     v = 12\n"
+                      "... | [lines 13-300 not shown]", block)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from support import FakeServer, agent, make_ella
+
+
+class GitHubClientTest(unittest.TestCase):
+    def start(self, respond):
+        server = FakeServer(respond)
+        client = agent.GitHubClient("token", server.url)
+        self.addCleanup(server.close)
+        self.addCleanup(client.close)
+        sleep = mock.patch.object(agent.time, "sleep").start()
+        self.addCleanup(mock.patch.stopall)
+        return server, client, sleep
+
+    def test_etag_revalidation_reuses_cached_body(self):
+        def respond(request):
+            if request["headers"].get("If-None-Match") == '"v1"':
+                return 304, {"ETag": '"v1"'}, b""
+            return 200, {"ETag": '"v1"'}, {"title": "first"}
+
+        server, client, _ = self.start(respond)
+        self.assertEqual(client.api("GET", "repos/o/r/issues/1"), {"title": "first"})
+        self.assertEqual(client.api("GET", "repos/o/r/issues/1"), {"title": "first"})
+        self.assertEqual(server.requests[1]["headers"]["Authorization"], "Bearer token")
+        self.assertEqual(len({r["client"] for r in server.requests}), 1)
+
+    def test_rate_limited_request_waits_for_retry_after(self):
+        def respond(request):
+            if len(server.requests) == 1:
+                return 403, {"Retry-After": "7"}, {"message": "secondary rate limit"}
+            return 201, {}, {"id": 5}
+
+        server, client, sleep = self.start(respond)
+        self.assertEqual(client.api("POST", "repos/o/r/issues/1/comments", body={"body": "x"}), {"id": 5})
+        sleep.assert_called_once_with(7.0)
+        self.assertEqual(len(server.requests), 2)
+
+    def test_server_errors_retry_gets_but_not_posts(self):
+        server, client, _ = self.start(lambda request: (502, {}, {"message": "bad gateway"}))
+        with self.assertRaises(agent.CommandError):
+            client.api("POST", "repos/o/r/issues/1/comments", body={"body": "x"})
+        self.assertEqual(len(server.requests), 1)
+
+        with self.assertRaises(agent.CommandError):
+            client.api("GET", "repos/o/r/issues/1")
+        self.assertEqual(len(server.requests), 2 + agent.GITHUB_MAX_RETRIES)
+
+    def test_connection_refused_is_retried_for_posts(self):
+        server, client, sleep = self.start(lambda request: (201, {}, {"id": 1}))
+        real_connect = agent.http.client.HTTPConnection.connect
+        calls = []
+
+        def flaky_connect(conn):
+            calls.append(conn)
+            if len(calls) == 1:
+                raise ConnectionRefusedError("refused")
+            return real_connect(conn)
+
+        with mock.patch.object(agent.http.client.HTTPConnection, "connect", flaky_connect):
+            self.assertEqual(client.api("POST", "repos/o/r/labels", body={"name": "bug"}), {"id": 1})
+        self.assertEqual(len(server.requests), 1)
+        sleep.assert_called_once()
+
+
+class EllaGitHubCallsTest(unittest.TestCase):
+    def start(self, respond):
+        server = FakeServer(respond)
+        self.addCleanup(server.close)
+        mock.patch.object(agent, "CACHE_DIR", Path(tempfile.mkdtemp(prefix="ella-test-cache-"))).start()
+        self.addCleanup(mock.patch.stopall)
+        ella = make_ella()
+        ella.github = agent.GitHubClient("token", server.url)
+        self.addCleanup(ella.github.close)
+        return server, ella
+
+    def test_comments_and_progress_updates(self):
+        server, ella = self.start(lambda request: (201 if request["method"] == "POST" else 200, {}, {"id": 77}))
+        ella.comment("hello")
+        ella.create_progress_comment("working")
+        ella.send_progress("done")
+
+        self.assertEqual(ella.progress_comment_id, "77")
+        self.assertEqual([(r["method"], r["path"], r["body"]) for r in server.requests], [
+            ("POST", "/repos/owner/repo/issues/1/comments", {"body": "hello"}),
+            ("POST", "/repos/owner/repo/issues/1/comments", {"body": "working"}),
+            ("PATCH", "/repos/owner/repo/issues/comments/77", {"body": "done"}),
+        ])
+
+    def test_pr_metadata_has_the_cli_shape(self):
+        pr = {
+            "title": "T", "body": None, "html_url": "https://example/pr/1", "number": 1,
+            "user": {"login": "alice", "node_id": "U_1", "type": "User"},
+            "state": "closed", "merged_at": "2024-01-01T00:00:00Z", "draft": False,
+            "base": {"ref": "main", "repo": {"full_name": "owner/repo"}},
+            "head": {"ref": "topic", "repo": {"name": "repo", "full_name": "fork/repo", "owner": {"login": "fork"}}},
+        }
+
+        def respond(request):
+            if request["headers"]["Accept"] == "application/vnd.github.diff":
+                return 200, {"Content-Type": "text/plain"}, "diff --git a/x b/x\n"
+            return 200, {}, pr
+
+        _, ella = self.start(respond)
+        ella.load_pr_metadata()
+
+        self.assertEqual(ella.pr_info["author"], {"id": "U_1", "is_bot": False, "login": "alice", "name": ""})
+        self.assertEqual(ella.pr_info["body"], "")
+        self.assertEqual(ella.pr_info["state"], "MERGED")
+        self.assertTrue(ella.pr_info["isCrossRepository"])
+        self.assertEqual(ella.pr_info["headRepositoryOwner"], {"login": "fork"})
+
+    def test_sync_labels_creates_only_missing_labels(self):
+        def respond(request):
+            if request["method"] == "GET":
+                return 200, {}, [{"name": "Bug"}]
+            if request["body"]["name"] == "broken":
+                return 422, {}, {"message": "Validation Failed"}
+            return 201, {}, request["body"]
+
+        server, ella = self.start(respond)
+        ella.sync_labels([{"name": "bug"}, {"name": "docs", "color": "0000ff"}, {"name": "broken"}])
+
+        created = [r["body"] for r in server.requests if r["method"] == "POST"]
+        self.assertEqual(created, [
+            {"name": "docs", "color": "0000ff", "description": ""},
+            {"name": "broken", "color": "ededed", "description": ""},
+        ])
+        cached = json.loads((agent.CACHE_DIR / "labels" / "owner__repo.json").read_text(encoding="utf-8"))
+        self.assertEqual(cached["labels"], ["bug", "docs"])
+
+    def test_unchecked_requests_return_none_when_the_server_is_gone(self):
+        server, ella = self.start(lambda request: (200, {}, {}))
+        server.close()
+        with mock.patch.object(agent.time, "sleep"):
+            self.assertIsNone(ella.github.api("POST", "repos/o/r/labels", body={}, check=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
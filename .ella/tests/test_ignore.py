@@ -0,0 +1,69 @@
+import fnmatch
+import os
+import random
+import time
+import unittest
+from pathlib import Path
+
+from support import agent
+
+
+def fnmatch_is_ignored(path, patterns):
+    normalized = path.replace("\\", "/")
+    for pattern in patterns:
+        p = pattern.strip().replace("\\", "/")
+        if not p:
+            continue
+        if fnmatch.fnmatch(normalized, p):
+            return True
+        if p.endswith("/**") and normalized.startswith(p[:-3]):
+            return True
+        if "/" not in p and fnmatch.fnmatch(Path(normalized).name, p):
+            return True
+    return False
+
+
+def synthetic_paths(count):
+    rng = random.Random(1234)
+    dirs = ["apps/web/src", "apps/docs/src/app", "packages/ui/src/components", "packages/db/src",
+            "scripts", ".github/workflows", "apps/web/.next/cache", "packages/utils/dist",
+            "node_modules/react", "apps/web/node_modules/.bin", "src/__pycache__", "target/debug"]
+    names = ["index.ts", "page.tsx", "button.tsx", "schema.ts", "README.md", ".env", ".env.local",
+             "bundle.min.js", "app.js.map", "pnpm-lock.yaml", "types.generated.ts", "mod.py"]
+    return [f"{rng.choice(dirs)}/{rng.randrange(50)}/{rng.choice(names)}" for _ in range(count)]
+
+
+class IgnoreMatcherTest(unittest.TestCase):
+    def test_matches_the_fnmatch_rules(self):
+        patterns = [*agent.DEFAULT_IGNORE, "", "docs/**", "*.generated.ts"]
+        matcher = agent.IgnoreMatcher(patterns)
+        for path in synthetic_paths(2000):
+            self.assertEqual(agent.is_ignored(path, matcher), fnmatch_is_ignored(path, patterns), path)
+
+    @unittest.skipUnless(os.environ.get("ELLA_BENCHMARK"), "set ELLA_BENCHMARK=1 to time the matcher")
+    def test_benchmark_against_the_fnmatch_loop(self):
+        patterns = list(agent.DEFAULT_IGNORE)
+        paths = synthetic_paths(100_000)
+
+        started = time.perf_counter()
+        expected = [fnmatch_is_ignored(path, patterns) for path in paths]
+        fnmatch_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        matcher = agent.IgnoreMatcher(patterns)
+        compiled = [agent.is_ignored(path, matcher) for path in paths]
+        compiled_seconds = time.perf_counter() - started
+
+        print(f"\npaths: {len(paths)}, patterns: {len(patterns)}, ignored: {sum(compiled)}")
+        print(f"fnmatch loop:     {fnmatch_seconds:.3f}s")
+        print(f"compiled matcher: {compiled_seconds:.3f}s")
+        print(f"speedup:          {fnmatch_seconds / compiled_seconds:.1f}x")
+        self.assertEqual(compiled, expected)
+        self.assertLess(compiled_seconds, fnmatch_seconds)
+
+    def test_empty_matcher_ignores_nothing(self):
+        self.assertFalse(agent.is_ignored("src\\app.ts", agent.IgnoreMatcher([" ", ""])))
+
+
+if __name__ == "__main__":
+    unittest.main()
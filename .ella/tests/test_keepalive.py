@@ -0,0 +1,136 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from support import FakeServer, agent, make_ella
+
+
+def sse(*chunks: str) -> bytes:
+    events = [f'data: {{"choices": [{{"delta": {{"content": "{chunk}"}}}}]}}\n\n' for chunk in chunks]
+    return ("".join(events) + "data: [DONE]\n\n").encode("utf-8")
+
+
+class StreamingEndpointTest(unittest.TestCase):
+    def start(self, respond):
+        server = FakeServer(respond)
+        self.addCleanup(server.close)
+        ella = make_ella()
+        ella.ai_base_url = server.url + "/v1"
+        ella.ai_model = "test-model"
+        ella.ai_api_key = "key"
+        self.addCleanup(ella.close)
+        return server, ella
+
+    def test_stream_requests_reuse_one_connection(self):
+        server, ella = self.start(
+            lambda request: (200, {"Content-Type": "text/event-stream"}, sse("Hel", "lo")))
+        out = Path(tempfile.mkdtemp(prefix="ella-test-sse-"))
+
+        first = ella.ai_call("context", "system", 100, out=out)
+        second = ella.ai_call("context", "system", 100, out=out)
+
+        self.assertEqual((first, second), ("Hello", "Hello"))
+        self.assertEqual([r["path"] for r in server.requests], ["/v1/chat/completions"] * 2)
+        self.assertEqual(server.requests[0]["client"], server.requests[1]["client"])
+        self.assertEqual([t["reused"] for t in ella.ai_client.timings], [False, True])
+
+    def test_usage_is_requested_and_dropped_when_rejected(self):
+        usage = b'data: {"choices": [], "usage": {"prompt_tokens": 10}}\n\n'
+
+        def respond(request):
+            if "stream_options" in request["body"]:
+                return 400, {}, {"error": {"message": "Unrecognized request argument supplied: stream_options"}}
+            return 200, {"Content-Type": "text/event-stream"}, usage + sse("ok")
+
+        server, ella = self.start(respond)
+        out = Path(tempfile.mkdtemp(prefix="ella-test-sse-"))
+        self.assertEqual(ella.ai_call("context", "system", 100, out=out), "ok")
+        self.assertEqual(ella.ai_call("context", "system", 100, out=out), "ok")
+
+        self.assertEqual(server.requests[0]["body"]["stream_options"], {"include_usage": True})
+        self.assertEqual(["stream_options" in r["body"] for r in server.requests], [True, False, False])
+        self.assertEqual(ella.ai_client.timings[-1]["usage"], {"prompt_tokens": 10})
+
+    def test_other_bad_requests_still_fail(self):
+        server, ella = self.start(lambda request: (400, {}, {"error": {"message": "context too long"}}))
+        out = Path(tempfile.mkdtemp(prefix="ella-test-sse-"))
+        with self.assertRaisesRegex(agent.CommandError, "HTTP status 400"):
+            ella.ai_call("context", "system", 100, out=out)
+        self.assertEqual(len(server.requests), 1)
+
+    def test_redirect_names_the_location(self):
+        _, ella = self.start(lambda request: (308, {"Location": "https://elsewhere/v1/chat/completions"}, b""))
+        out = Path(tempfile.mkdtemp(prefix="ella-test-sse-"))
+        with self.assertRaisesRegex(agent.CommandError, "elsewhere"):
+            ella.ai_call("context", "system", 100, out=out)
+
+    def test_oversized_stream_is_aborted(self):
+        _, ella = self.start(lambda request: (200, {"Content-Type": "text/event-stream"}, b"data: " + b"x" * 300_000))
+        out = Path(tempfile.mkdtemp(prefix="ella-test-sse-"))
+        with mock.patch.object(agent, "AI_MAX_RESPONSE_BYTES", 100_000):
+            with self.assertRaisesRegex(agent.CommandError, "exceeded 100000 bytes"):
+                ella.ai_call("context", "system", 100, out=out)
+        self.assertIn("[aborted:", (out / "response.stream").read_text(encoding="utf-8"))
+
+
+class ResponseLinesTest(unittest.TestCase):
+    class Stream:
+        def __init__(self, chunks, endless=False):
+            self.chunks = list(chunks)
+            self.endless = endless
+            self.reads = 0
+
+        def read1(self, size):
+            self.reads += 1
+            if self.chunks:
+                return self.chunks.pop(0)
+            return b"x" * size if self.endless else b""
+
+    def test_lines_split_across_chunks(self):
+        response = self.Stream([b"data: a", b"b\n\nda", b"ta: c\n", b"tail"])
+        self.assertEqual(list(agent.iter_response_lines(response, 1000)),
+                         [b"data: ab\n", b"\n", b"data: c\n", b"tail"])
+
+    def test_a_line_without_newline_stops_at_the_limit(self):
+        response = self.Stream([], endless=True)
+        with self.assertRaises(agent.CommandError):
+            list(agent.iter_response_lines(response, 200_000, chunk_size=65536))
+        self.assertEqual(response.reads, 4)
+
+
+class ProxyTest(unittest.TestCase):
+    def test_http_requests_go_through_the_proxy(self):
+        server = FakeServer(lambda request: (200, {}, {"ok": True}))
+        self.addCleanup(server.close)
+        proxy = server.url.replace("http://", "http://user:secret@")
+        with mock.patch.dict(os.environ, {"HTTP_PROXY": proxy, "http_proxy": proxy, "NO_PROXY": "", "no_proxy": ""}):
+            client = agent.KeepAliveClient("http://api.example.test/v1", pool_size=1, idle_timeout=60, timeout=10)
+        self.addCleanup(client.close)
+
+        with client.request("GET", "/models") as (response, _):
+            self.assertEqual(response.status, 200)
+            response.read()
+
+        request = server.requests[0]
+        self.assertEqual(request["path"], "http://api.example.test/v1/models")
+        self.assertEqual(request["headers"]["Proxy-Authorization"], "Basic dXNlcjpzZWNyZXQ=")
+
+    def test_https_uses_a_tunnel_unless_bypassed(self):
+        env = {"HTTPS_PROXY": "proxy.test:3128", "https_proxy": "proxy.test:3128"}
+        with mock.patch.dict(os.environ, {**env, "NO_PROXY": "", "no_proxy": ""}):
+            conn = agent.KeepAliveClient("https://api.example.test", pool_size=1, idle_timeout=60,
+                                         timeout=10).new_connection()
+        self.assertEqual((conn.host, conn.port), ("proxy.test", 3128))
+        self.assertEqual(conn._tunnel_host, "api.example.test")
+
+        with mock.patch.dict(os.environ, {**env, "NO_PROXY": "example.test", "no_proxy": "example.test"}):
+            conn = agent.KeepAliveClient("https://api.example.test", pool_size=1, idle_timeout=60,
+                                         timeout=10).new_connection()
+        self.assertEqual(conn.host, "api.example.test")
+        self.assertIsNone(conn._tunnel_host)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import agent
+
+
+class SplitJoinTest(unittest.TestCase):
+    def round_trip(self, text: str) -> str:
+        lines, eols, trailing = agent.split_text_lines(text)
+        return agent.join_text_lines(lines, eols, trailing)
+
+    def test_round_trips_byte_for_byte(self):
+        samples = [
+            "",
+            "a",
+            "a\n",
+            "a\r\nb\r\n",
+            "a\r\nb\nc\r\n",
+            "form\ffeed\n\vtab\x1cgroup\x1d\x1e\x85next line para\n",
+            "lone\rreturn\nend",
+            "\n\n",
+        ]
+        for text in samples:
+            with self.subTest(text=text):
+                self.assertEqual(self.round_trip(text), text)
+
+
+class UnifiedPatchTest(unittest.TestCase):
+    def test_keeps_untouched_line_endings_in_mixed_file(self):
+        original = "one\r\ntwo\nthree\r\nfour\n"
+        patch = "@@ -2,2 +2,2 @@\n two\n-three\n+THREE\n"
+        self.assertEqual(agent.apply_unified_patch(original, patch), "one\r\ntwo\nTHREE\nfour\n")
+
+    def test_keeps_special_separators_inside_lines(self):
+        original = "a\fb\nc d\ne\n"
+        patch = "@@ -3 +3 @@\n-e\n+E\n"
+        self.assertEqual(agent.apply_unified_patch(original, patch), "a\fb\nc d\nE\n")
+
+    def test_uses_majority_ending_for_new_lines(self):
+        original = "a\r\nb\r\n"
+        patch = "@@ -2 +2,2 @@\n b\n+c\n"
+        self.assertEqual(agent.apply_unified_patch(original, patch), "a\r\nb\r\nc\r\n")
+
+    def test_preserves_missing_trailing_newline(self):
+        self.assertEqual(agent.apply_unified_patch("a\nb", "@@ -1 +1 @@\n-a\n+A\n"), "A\nb")
+        self.assertEqual(agent.apply_unified_patch("a\nb", "@@ -2 +2,2 @@\n b\n+c\n"), "a\nb\nc")
+
+    def test_rejects_mismatched_hunk(self):
+        with self.assertRaises(agent.PatchError):
+            agent.apply_unified_patch("a\n", "@@ -1 +1 @@\n-zzz\n+A\n")
+
+
+class SearchReplaceTest(unittest.TestCase):
+    def test_exact_match(self):
+        edits = [{"search": "b\r\n", "replace": "B\r\n"}]
+        self.assertEqual(agent.apply_search_replace("a\r\nb\r\nc\n", edits), "a\r\nB\r\nc\n")
+
+    def test_whitespace_tolerant_match_keeps_other_lines(self):
+        edits = [{"search": "  b  \n", "replace": "B\n"}]
+        self.assertEqual(agent.apply_search_replace("a\r\nb\nc\fd\r\n", edits), "a\r\nB\nc\fd\r\n")
+
+    def test_ambiguous_search_is_rejected(self):
+        with self.assertRaises(agent.PatchError):
+            agent.apply_search_replace("x\nx\n", [{"search": "x", "replace": "y"}])
+
+
+class WriteFilesTest(unittest.TestCase):
+    def test_keeps_the_mode_of_existing_files(self):
+        root = Path(tempfile.mkdtemp(prefix="ella-test-write-"))
+        script = root / "hook.sh"
+        script.write_text("#!/bin/sh\n", encoding="utf-8")
+        script.chmod(0o755)
+
+        agent.write_files_atomically({script: "#!/bin/sh\nexit 0\n", root / "new" / "file.txt": "new\n"})
+
+        self.assertEqual(stat.S_IMODE(script.stat().st_mode), 0o755)
+        self.assertEqual(script.read_text(encoding="utf-8"), "#!/bin/sh\nexit 0\n")
+        self.assertEqual((root / "new" / "file.txt").read_text(encoding="utf-8"), "new\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
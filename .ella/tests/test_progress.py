@@ -0,0 +1,85 @@
+import threading
+import time
+import unittest
+
+from support import agent
+
+
+class ProgressUpdaterTest(unittest.TestCase):
+    def setUp(self):
+        self.sent: list[tuple[float, str]] = []
+        self.release = threading.Event()
+        self.release.set()
+        self.entered = threading.Event()
+        self.delivered = threading.Condition()
+
+    def send(self, body):
+        self.entered.set()
+        self.release.wait(5)
+        with self.delivered:
+            self.sent.append((time.monotonic(), body))
+            self.delivered.notify_all()
+
+    def wait_for(self, count):
+        with self.delivered:
+            self.assertTrue(self.delivered.wait_for(lambda: len(self.sent) >= count, 5))
+
+    def updater(self, min_interval):
+        updater = agent.ProgressUpdater(self.send, min_interval)
+        self.addCleanup(updater.close, 5)
+        return updater
+
+    def test_updates_during_a_slow_send_are_coalesced_to_the_latest(self):
+        updater = self.updater(0)
+        self.release.clear()
+        updater.submit("first")
+        self.assertTrue(self.entered.wait(5))
+        for body in ["second", "third", "fourth"]:
+            updater.submit(body)
+        self.release.set()
+        updater.close(5)
+
+        self.assertEqual([body for _, body in self.sent], ["first", "fourth"])
+
+    def test_sends_are_spaced_by_the_minimum_interval(self):
+        updater = self.updater(0.3)
+        updater.submit("first")
+        self.wait_for(1)
+        updater.submit("second")
+        self.wait_for(2)
+
+        self.assertGreaterEqual(self.sent[1][0] - self.sent[0][0], 0.29)
+
+    def test_close_flushes_the_pending_update_without_waiting(self):
+        updater = self.updater(60)
+        updater.submit("first")
+        self.wait_for(1)
+        updater.submit("final")
+
+        started = time.monotonic()
+        updater.close(5)
+
+        self.assertEqual([body for _, body in self.sent], ["first", "final"])
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_a_failed_send_does_not_stop_later_updates(self):
+        calls = []
+        entered = threading.Event()
+
+        def flaky(body):
+            calls.append(body)
+            entered.set()
+            if body == "first":
+                raise RuntimeError("boom")
+
+        updater = agent.ProgressUpdater(flaky, 0)
+        updater.submit("first")
+        self.assertTrue(entered.wait(5))
+        updater.submit("second")
+        updater.close(5)
+
+        self.assertEqual(calls, ["first", "second"])
+
+
+if __name__ == "__main__":
+    unittest.main()
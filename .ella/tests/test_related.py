@@ -0,0 +1,70 @@
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import agent, make_ella
+
+
+def git(root, *args):
+    agent.run_cmd(["git", *args], cwd=root)
+
+
+class RelatedTestsTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="ella-test-root-"))
+        self.out = Path(tempfile.mkdtemp(prefix="ella-test-out-"))
+        self.ella = make_ella()
+        self.ella.mode = "solve"
+
+    def commit(self, files):
+        for rel, text in files.items():
+            (self.root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / rel).write_text(text, encoding="utf-8")
+        git(self.root, "init", "-q")
+        git(self.root, "add", "-A")
+        git(self.root, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "init")
+
+    def select(self, name, cmd):
+        return self.ella.select_related_tests([(name, cmd)], self.root, self.out)
+
+    def test_pytest_narrows_to_importers_and_falls_back_for_other_files(self):
+        self.commit({
+            "pkg/__init__.py": "",
+            "pkg/a.py": "X = 1\n",
+            "tests/test_a.py": "from pkg import a\n",
+            "tests/test_b.py": "\n",
+            "tests/data.json": "{}\n",
+        })
+        cmd = [sys.executable, "-m", "pytest"]
+        (self.root / "pkg" / "a.py").write_text("X = 2\n", encoding="utf-8")
+        self.assertEqual(self.select("python-pytest", cmd), ([("python-pytest", [*cmd, "tests/test_a.py"])], True))
+
+        (self.root / "tests" / "data.json").write_text("[]\n", encoding="utf-8")
+        self.assertEqual(self.select("python-pytest", cmd), ([("python-pytest", cmd)], False))
+
+    def test_vitest_never_receives_deleted_or_non_module_paths(self):
+        self.commit({
+            "package.json": json.dumps({"scripts": {"test": "vitest"}}),
+            "node_modules/.bin/vitest": "",
+            "src/a.ts": "export const a = 1\n",
+            "src/b.ts": "export const b = 1\n",
+            "src/fixture.json": "{}\n",
+        })
+        vitest = str(self.root / "node_modules" / ".bin" / "vitest")
+        (self.root / "src" / "a.ts").write_text("export const a = 2\n", encoding="utf-8")
+        selected, narrowed = self.select("node-test", ["pnpm", "test"])
+        self.assertTrue(narrowed)
+        self.assertEqual(selected[0][1], [vitest, "related", "--run", "--passWithNoTests", "src/a.ts"])
+
+        (self.root / "src" / "b.ts").unlink()
+        self.assertEqual(self.select("node-test", ["pnpm", "test"]), ([("node-test", ["pnpm", "test"])], False))
+
+        git(self.root, "checkout", "-q", "--", "src/b.ts")
+        (self.root / "src" / "fixture.json").write_text("[]\n", encoding="utf-8")
+        self.assertEqual(self.select("node-test", ["pnpm", "test"]), ([("node-test", ["pnpm", "test"])], False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from support import agent, make_ella
+
+
+class RetrievalTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="ella-test-root-"))
+        self.out = Path(tempfile.mkdtemp(prefix="ella-test-out-"))
+        mock.patch.object(agent, "ROOT", self.root).start()
+        self.addCleanup(mock.patch.stopall)
+        self.ella = make_ella()
+        self.ella.mode = "fix"
+
+    def test_header_counts_rounds_not_requested_files(self):
+        needs = json.dumps({"needs_files": ["a.py", "b.py"]})
+        self.ella.ai_call = mock.Mock(side_effect=[needs, "done"])
+        self.ella.apply_ai_response = mock.Mock(return_value="needs_files")
+        self.ella.collect_requests = mock.Mock(return_value=[
+            {"key": "file:a.py", "kind": "file", "rel": "a.py"},
+            {"key": "file:b.py", "kind": "file", "rel": "b.py"},
+        ])
+
+        self.assertEqual(self.ella.call_with_retrieval(["context"], "system", self.root, self.out), "done")
+        report = (self.out / "retrieval.md").read_text(encoding="utf-8")
+        self.assertTrue(report.startswith(f"Retrieval rounds: 1/{agent.MAX_RETRIEVAL_ROUNDS}\n"))
+
+    def test_missing_files_leave_the_ledger_at_the_next_attempt(self):
+        (self.root / "present.py").write_text("x = 1\n", encoding="utf-8")
+        self.ella.add_to_ledger([
+            {"key": "file:present.py", "kind": "file", "rel": "present.py"},
+            {"key": "file:later.py", "kind": "file", "rel": "later.py"},
+        ])
+        self.assertIn("MISSING OR BLOCKED: later.py", self.ella.ledger_context())
+
+        self.ella.prune_ledger()
+        self.assertEqual(list(self.ella.context_ledger), ["file:present.py"])
+
+        (self.root / "later.py").write_text("y = 2\n", encoding="utf-8")
+        self.ella.add_to_ledger([{"key": "file:later.py", "kind": "file", "rel": "later.py"}])
+        self.ella.prune_ledger()
+        self.assertIn("REQUESTED FILE: later.py", self.ella.ledger_context())
+        self.assertNotIn("MISSING", self.ella.ledger_context())
+
+
+if __name__ == "__main__":
+    unittest.main()
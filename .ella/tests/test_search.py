@@ -0,0 +1,42 @@
+import re
+import unittest
+
+from support import agent
+
+
+class TrigramIndexTest(unittest.TestCase):
+    files = {
+        "a.py": "def load_config(path):\n    return open(path)\n",
+        "b.py": "def load_cache(path):\n    return None\n",
+        "c.ts": "export const fooBar = 1;\n",
+    }
+
+    def matching(self, query):
+        pattern = re.compile(query)
+        return {rel for rel, text in self.files.items() if pattern.search(text)}
+
+    def test_candidates_never_drop_matching_files(self):
+        index = agent.TrigramIndex(self.files)
+        for query in [
+            r"load_(?!config)\w+",
+            r"(?<!foo)load_cache",
+            r"(?<=def )load_\w+\(path\)",
+            r"load_c(?=onfig)",
+            r"(?P<name>load)_(?P=name)?cache",
+            r"load(?#comment)_config",
+            r"[(]path[)]",
+            r"fooBar\s*=",
+        ]:
+            with self.subTest(query=query):
+                found = index.candidates(query, True)
+                self.assertTrue(found is None or self.matching(query) <= found)
+
+    def test_lookarounds_are_not_required_literals(self):
+        self.assertEqual(agent.TrigramIndex.required_words(r"load_(?!config)\w+", True), ["load_"])
+        self.assertEqual(agent.TrigramIndex.required_words(r"(?<!bar)foo(?=(baz|qux))", True), ["foo"])
+        self.assertEqual(agent.TrigramIndex.required_words(r"abc\((?!x\)y)def", True), ["abc", "def"])
+        self.assertEqual(agent.TrigramIndex.required_words(r"(?P<word>foo)bar", True), ["foo", "bar"])
+
+
+if __name__ == "__main__":
+    unittest.main()
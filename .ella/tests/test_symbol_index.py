@@ -0,0 +1,68 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from support import agent, make_ella
+
+
+class SymbolIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="ella-test-root-"))
+        self.cache = Path(tempfile.mkdtemp(prefix="ella-test-cache-"))
+        run_git = agent.git
+        for name, value in (
+            ("ROOT", self.root),
+            ("CACHE_DIR", self.cache),
+            ("git", lambda args, check=True: run_git(["-C", str(self.root), *args], check=check)),
+        ):
+            patcher = mock.patch.object(agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        agent.git(["init", "-q"])
+        self.ella = make_ella()
+        self.ella.workspace_packages = {}
+
+    def commit(self, files):
+        for rel, text in files.items():
+            (self.root / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / rel).write_text(text, encoding="utf-8")
+        agent.git(["add", "-A"])
+        agent.git(["-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "change"])
+
+    def load(self):
+        with mock.patch.object(agent, "scan_source_file", wraps=agent.scan_source_file) as scan:
+            index = self.ella.load_symbol_index()
+        return index, sorted(call.args[0] for call in scan.call_args_list)
+
+    def test_rebuild_rescans_only_changed_blobs(self):
+        self.commit({
+            "src/alpha.ts": "export function alpha() {}\n",
+            "src/beta.ts": "export const beta = 1\n",
+            "README.md": "# docs\n",
+        })
+        index, scanned = self.load()
+        self.assertEqual(scanned, ["src/alpha.ts", "src/beta.ts"])
+        self.assertEqual(index["src/beta.ts"]["symbols"], ["beta"])
+
+        self.commit({"src/beta.ts": "export const betaRenamed = 1\n"})
+        index, scanned = self.load()
+
+        self.assertEqual(scanned, ["src/beta.ts"])
+        self.assertEqual(index["src/alpha.ts"]["symbols"], ["alpha"])
+        self.assertEqual(index["src/beta.ts"]["symbols"], ["betaRenamed"])
+        report = (agent.OUT / "symbol-index.md").read_text(encoding="utf-8")
+        self.assertIn("2 files, 1 scanned, 1 reused from the previous index", report)
+
+    def test_same_tree_is_a_cache_hit(self):
+        self.commit({"src/alpha.ts": "export function alpha() {}\n"})
+        first, _ = self.load()
+
+        second, scanned = self.load()
+
+        self.assertEqual(scanned, [])
+        self.assertEqual(second, first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from support import agent, make_ella
+
+
+def write_package(root: Path, rel: str, name: str, **deps) -> None:
+    (root / rel).mkdir(parents=True, exist_ok=True)
+    (root / rel / "package.json").write_text(json.dumps({"name": name, **deps}), encoding="utf-8")
+
+
+class WorkspacePackagesTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="ella-test-workspace-"))
+
+    def test_reads_pnpm_globs_and_keeps_only_workspace_dependencies(self):
+        (self.root / "pnpm-workspace.yaml").write_text(
+            "packages:\n  - 'apps/*'\n  - packages/*  # libraries\n  - '!packages/private'\n", encoding="utf-8")
+        write_package(self.root, "apps/web", "@x/web", dependencies={"@x/ui": "workspace:*", "react": "^18"})
+        write_package(self.root, "packages/ui", "@x/ui", devDependencies={"@x/utils": "workspace:*"})
+        write_package(self.root, "packages/utils", "@x/utils")
+        write_package(self.root, "packages/private", "@x/private")
+        (self.root / "packages" / "docs").mkdir()
+
+        packages = agent.load_workspace_packages(self.root)
+
+        self.assertEqual(packages, {
+            "@x/web": {"dir": "apps/web", "deps": ["@x/ui"]},
+            "@x/ui": {"dir": "packages/ui", "deps": ["@x/utils"]},
+            "@x/utils": {"dir": "packages/utils", "deps": []},
+        })
+
+    def test_falls_back_to_package_json_workspaces(self):
+        (self.root / "package.json").write_text(json.dumps({"workspaces": {"packages": ["libs/*"]}}), encoding="utf-8")
+        write_package(self.root, "libs/a", "a")
+
+        self.assertEqual(agent.load_workspace_packages(self.root), {"a": {"dir": "libs/a", "deps": []}})
+
+
+class AffectedPackagesTest(unittest.TestCase):
+    packages = {
+        "@x/web": {"dir": "apps/web", "deps": ["@x/ui"]},
+        "@x/docs": {"dir": "apps/docs", "deps": []},
+        "@x/ui": {"dir": "packages/ui", "deps": ["@x/utils"]},
+        "@x/utils": {"dir": "packages/utils", "deps": []},
+    }
+
+    def test_includes_transitive_dependents(self):
+        self.assertEqual(agent.affected_packages(self.packages, ["packages/utils/src/index.ts"]),
+                         ["@x/ui", "@x/utils", "@x/web"])
+
+    def test_leaf_change_stays_in_its_package(self):
+        self.assertEqual(agent.affected_packages(self.packages, ["apps/docs/page.mdx"]), ["@x/docs"])
+
+    def test_files_outside_every_package_disable_scoping(self):
+        self.assertIsNone(agent.affected_packages(self.packages, ["apps/web/a.ts", "turbo.json"]))
+        self.assertIsNone(agent.affected_packages(self.packages, []))
+        self.assertIsNone(agent.affected_packages({}, ["apps/web/a.ts"]))
+
+
+class DetectCheckCommandsTest(unittest.TestCase):
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="ella-test-detect-"))
+        patcher = mock.patch.object(agent, "ROOT", self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        (self.root / "pnpm-lock.yaml").write_text("", encoding="utf-8")
+        (self.root / "package.json").write_text(json.dumps({"scripts": {
+            "lint": "turbo lint && eslint . --max-warnings 0",
+            "type-check": "turbo type-check",
+            "build": "turbo build",
+        }}), encoding="utf-8")
+        self.ella = make_ella()
+
+    def test_unscoped_runs_the_scripts(self):
+        self.assertEqual(self.ella.detect_check_commands(), [
+            ("node-lint", ["pnpm", "run", "lint"]),
+            ("node-typecheck", ["pnpm", "run", "type-check"]),
+            ("node-build", ["pnpm", "run", "build"]),
+        ])
+
+    def test_scopes_plain_turbo_scripts(self):
+        checks = dict(self.ella.detect_check_commands(["@x/ui", "@x/web"]))
+        self.assertEqual(checks["node-typecheck"], ["pnpm", "run", "type-check", "--filter=@x/ui", "--filter=@x/web"])
+        self.assertEqual(checks["node-build"], ["pnpm", "run", "build", "--filter=@x/ui", "--filter=@x/web"])
+
+    def test_scopes_the_turbo_part_of_a_chained_script(self):
+        bin_dir = self.root / "node_modules" / ".bin"
+        bin_dir.mkdir(parents=True)
+        for tool in ["turbo", "eslint"]:
+            (bin_dir / tool).write_text(f'#!/bin/sh\necho {tool} "$@"\n', encoding="utf-8")
+            (bin_dir / tool).chmod(0o755)
+
+        cmd = dict(self.ella.detect_check_commands(["@x/ui"]))["node-lint"]
+        result = subprocess.run(cmd, cwd=self.root, capture_output=True, text=True)
+
+        self.assertEqual(result.stdout.splitlines(), ["turbo lint --filter=@x/ui", "eslint . --max-warnings 0"])
+
+
+if __name__ == "__main__":
+    unittest.main()